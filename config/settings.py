@@ -1,25 +1,33 @@
+import base64
+import logging
 import os
-import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
+from django.core.exceptions import ImproperlyConfigured
+
 # ── BASE DIR & ENV ────────────────────────────────────────────────────────────
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+_logger = logging.getLogger("config.settings")
+
 # Try multiple paths for .env file
 dotenv_path = BASE_DIR / ".env"
 if dotenv_path.exists():
     loaded = load_dotenv(dotenv_path)
-    print(f"✓ Loaded .env from {dotenv_path} (success: {loaded})", file=sys.stderr)
+    _logger.debug("Loaded .env from %s (success: %s)", dotenv_path, loaded)
 else:
-    print(f"✗ .env not found at {dotenv_path}", file=sys.stderr)
+    _logger.debug(".env not found at %s", dotenv_path)
     # Also check parent directory
     alt_dotenv = BASE_DIR.parent / ".env"
     if alt_dotenv.exists():
         load_dotenv(alt_dotenv)
-        print(f"✓ Loaded .env from {alt_dotenv}", file=sys.stderr)
+        _logger.debug("Loaded .env from %s", alt_dotenv)
 
 # ── SECURITY ──────────────────────────────────────────────────────────────────
+# Parse DEBUG before anything below depends on it
+DEBUG = os.environ.get("DEBUG", "1").strip().lower() in {"1", "true", "yes", "on"}
+
 SECRET_KEY = os.environ.get("SECRET_KEY") or os.environ.get("DJANGO_SECRET_KEY", "dev-secret-key")
 
 # Warn if using a weak or placeholder SECRET_KEY in non-development environments
@@ -31,26 +39,12 @@ if SECRET_KEY in ("changeme", "dev-secret-key", "devkey1234567890"):
             "Please set SECRET_KEY environment variable to a strong random value.",
             RuntimeWarning
         )
-    print(f"WARNING: Using placeholder SECRET_KEY in settings", file=sys.stderr)
-
-# Parse DEBUG as boolean - handle both string and integer values
-debug_value = os.environ.get("DEBUG", "1").lower()
-if debug_value in ("true", "1", "yes", "on"):
-    DEBUG = True
-elif debug_value in ("false", "0", "no", "off"):
-    DEBUG = False
-else:
-    try:
-        DEBUG = bool(int(debug_value))
-    except ValueError:
-        DEBUG = False
 
 # ALLOWED_HOSTS = os.environ.get("ALLOWED_HOSTS", "127.0.0.1,localhost").split(",")
 ALLOWED_HOSTS = ['127.0.0.1', 'localhost', 'tisp-server','10.10.10.1','10.10.10.2']
 
 # ── APPLICATIONS ─────────────────────────────────────────────────────────────
 INSTALLED_APPS = [
-    "grappelli",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
@@ -61,6 +55,11 @@ INSTALLED_APPS = [
     "wireguard",
 ]
 
+# Grappelli skins the admin; it must come before django.contrib.admin
+GRAPPELLI_ENABLED = os.environ.get("GRAPPELLI_ENABLED", "1").strip().lower() in {"1", "true", "yes", "on"}
+if GRAPPELLI_ENABLED:
+    INSTALLED_APPS.insert(0, "grappelli")
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -97,7 +96,8 @@ db_password = os.environ.get("DATABASE_PASSWORD", os.environ.get("POSTGRES_PASSW
 db_host = os.environ.get("DATABASE_HOST", os.environ.get("POSTGRES_HOST", "127.0.0.1"))
 db_port = int(os.environ.get("DATABASE_PORT", os.environ.get("POSTGRES_PORT", 5432)))
 
-print(f"Database Config: user={db_user} host={db_host} port={db_port} db={db_name}", file=sys.stderr)
+if DEBUG:
+    _logger.debug("Database Config: user=%s host=%s port=%s db=%s", db_user, db_host, db_port, db_name)
 
 DATABASES = {
     "default": {
@@ -107,6 +107,9 @@ DATABASES = {
         "PASSWORD": db_password,
         "HOST": db_host,
         "PORT": db_port,
+        # Reuse connections across requests instead of reconnecting each time
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
@@ -130,13 +133,23 @@ CACHES = {
         "LOCATION": REDIS_CACHE_URL,
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            # C RESP parser (requires the hiredis package)
+            "PARSER_CLASS": "redis.connection._HiredisParser",
+            "CONNECTION_POOL_KWARGS": {
+                "max_connections": 50,
+                "retry_on_timeout": True,
+                "socket_keepalive": True,
+            },
+            # Cache failures fall back to the database instead of erroring
+            "IGNORE_EXCEPTIONS": True,
         },
     }
 }
 
-print("Using Redis cache URL:", REDIS_CACHE_URL)
-print("Using Celery Broker:", CELERY_BROKER_URL)
-print("Using Celery Result Backend:", CELERY_RESULT_BACKEND)
+if DEBUG:
+    _logger.debug("Using Redis cache URL: %s", REDIS_CACHE_URL)
+    _logger.debug("Using Celery Broker: %s", CELERY_BROKER_URL)
+    _logger.debug("Using Celery Result Backend: %s", CELERY_RESULT_BACKEND)
 
 
 # ── ENCRYPTION / WIREGUARD ────────────────────────────────────────────────────
@@ -145,18 +158,30 @@ print("Using Celery Result Backend:", CELERY_RESULT_BACKEND)
 _encryption_key_value = os.environ.get("ENCRYPTION_KEY")
 
 if _encryption_key_value:
-    ENCRYPTION_KEY = _encryption_key_value.encode() if isinstance(_encryption_key_value, str) else _encryption_key_value
+    ENCRYPTION_KEY = _encryption_key_value.encode()
+    # Validate once here; utils.crypto derives and caches the cipher key from it
+    try:
+        _encryption_key_ok = len(base64.urlsafe_b64decode(ENCRYPTION_KEY)) == 32
+    except ValueError:
+        _encryption_key_ok = False
+    if not _encryption_key_ok:
+        raise ImproperlyConfigured(
+            "ENCRYPTION_KEY must be 32 url-safe base64-encoded bytes"
+        )
 else:
     # Generate a default key if not provided (for development only)
-    import sys
     from cryptography.fernet import Fernet
     ENCRYPTION_KEY = Fernet.generate_key()
-    print(f"WARNING: ENCRYPTION_KEY not set. Generated a temporary key for this session.", file=sys.stderr)
-    print(f"For production, set ENCRYPTION_KEY in .env with a persistent key:", file=sys.stderr)
-    print(f"  ENCRYPTION_KEY={ENCRYPTION_KEY.decode()}", file=sys.stderr)
+    if DEBUG:
+        _logger.debug("ENCRYPTION_KEY not set. Generated a temporary key for this session.")
+        _logger.debug("For production, set ENCRYPTION_KEY in .env with a persistent key.")
 
 WIREGUARD_INTERFACE = os.environ.get("WIREGUARD_INTERFACE", "wg0")
 WIREGUARD_ENDPOINT = os.environ.get("WIREGUARD_ENDPOINT", "127.0.0.1:51820")
+# "svg" (default) or "png" for clients that can't display SVG
+WIREGUARD_QR_FORMAT = os.environ.get("WIREGUARD_QR_FORMAT", "svg").strip().lower()
+# "native" (in-process X25519) or "wg" to shell out to the wg binary
+WIREGUARD_KEYGEN_BACKEND = os.environ.get("WIREGUARD_KEYGEN_BACKEND", "native").strip().lower()
 
 # ── PASSWORD VALIDATORS ──────────────────────────────────────────────────────
 AUTH_PASSWORD_VALIDATORS = [
@@ -176,10 +201,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # ── STATIC FILES ─────────────────────────────────────────────────────────────
 STATIC_URL = "static/"
-STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
-
-# Create staticfiles directory if it doesn't exist
-os.makedirs(STATIC_ROOT, exist_ok=True)
+STATIC_ROOT = BASE_DIR / "staticfiles"  # created by the image build / collectstatic
 
 # _______________ SECURITY SETTINGS _______________
 CSRF_TRUSTED_ORIGINS = [
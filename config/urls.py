@@ -2,12 +2,17 @@
 URL configuration for config project.
 
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from config import settings
 
 urlpatterns = [
-    path('grappelli/', include('grappelli.urls')),
     path('admin/', admin.site.urls),
     path('', include('wireguard.urls'))
 ]
+
+if settings.GRAPPELLI_ENABLED:
+    # Mounted only when grappelli is installed (GRAPPELLI_ENABLED). Its
+    # URLconf is imported on the first resolve()/reverse() either way, so
+    # leaving it out is the only way to skip that cost.
+    urlpatterns.insert(0, path('grappelli/', include('grappelli.urls')))
@@ -4,8 +4,44 @@ Socket-based deployment for use with nginx reverse proxy
 """
 
 import os
+import math
 import multiprocessing
 
+
+def cpu_quota() -> int:
+    """
+    Number of CPUs this process may actually use.
+
+    Honours the cgroup CPU quota (v2, then v1) so containers don't size
+    workers from the host CPU count, then falls back to the affinity mask
+    and finally multiprocessing.cpu_count().
+    """
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return max(1, math.ceil(quota / period))
+    except (OSError, ValueError):
+        pass
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
 # Server socket
 bind = "unix:/home/tisp/wg-auto/run/gunicorn.sock"
 backlog = 2048
@@ -14,8 +50,9 @@ backlog = 2048
 proc_name = "wireguard-auto"
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+workers = int(os.environ.get("GUNICORN_WORKERS", max(2, cpu_quota() * 2 + 1)))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -28,7 +65,32 @@ loglevel = "info"
 # Application
 pythonpath = "/home/tisp/wg-auto"
 wsgi_app = "config.wsgi:application"
+preload_app = True
 
 # Security and performance
 max_requests = 1000
 max_requests_jitter = 50
+
+
+# Server hooks
+def on_starting(server):
+    """
+    Import the hot modules in the master so forked workers share them
+    copy-on-write instead of each importing them again. preload_app has
+    already loaded the WSGI app (and so set up Django) at this point.
+    """
+    import wireguard.urls  # noqa: F401
+    import wireguard.admin_registry  # noqa: F401
+    from utils.crypto import CryptoService
+
+    # Derive the cipher key once so workers inherit it
+    CryptoService.encrypt("warm-up")
+
+
+def post_fork(server, worker):
+    """
+    Workers must not reuse DB connections opened in the master.
+    """
+    from django.db import connections
+
+    connections.close_all()
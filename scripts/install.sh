@@ -108,6 +108,12 @@ setup_system_user() {
     [[ -n "$SOURCE_USER" && "$SOURCE_USER" != "root" ]] && usermod -aG "$SYSTEM_USER" "$SOURCE_USER"
     usermod -aG "$SYSTEM_USER" www-data
 
+    # Config sync writes /etc/wireguard/*.conf directly via the wireguard
+    # group; sudo tee remains only as a fallback
+    mkdir -p /etc/wireguard
+    chown root:wireguard /etc/wireguard
+    chmod 2770 /etc/wireguard
+
     bash "$INSTALL_DIR/scripts/setup-sudoers.sh" "$SYSTEM_USER"
     log_success "System user and sudoers configured"
 }
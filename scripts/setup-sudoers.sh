@@ -68,6 +68,7 @@ echo "    - wg genkey        (generate private keys)"
 echo "    - wg pubkey        (derive public keys)"
 echo "    - wg show          (query interface status)"
 echo "    - wg set           (inject/remove peers live)"
+echo "    - wg syncconf      (apply bulk peer changes live)"
 echo "    - wg-quick up/down (manage interfaces)"
 echo "    - tee              (write configs to /etc/wireguard)"
 echo "    - chmod            (set proper permissions on configs)"
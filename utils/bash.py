@@ -1,6 +1,11 @@
+import shlex
 import subprocess
 from typing import List
 
+# Printed between commands by Bash.run_many so the combined stdout can be
+# split back into one section per command.
+_SECTION_MARKER = "__WG_AUTO_SECTION__"
+
 
 class Bash:
     """
@@ -8,15 +13,34 @@ class Bash:
     """
 
     @staticmethod
-    def run(cmd: List[str]) -> str:
+    def run(cmd: List[str], capture_stderr: bool = False) -> str:
+        """
+        Run a command and return its stdout without the trailing newline.
+
+        stderr is only piped when capture_stderr is set (e.g. to inspect
+        CalledProcessError.stderr); otherwise it goes to the parent's stderr.
+        """
         result = subprocess.run(
             cmd,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
+            stderr=subprocess.PIPE if capture_stderr else None,
             check=True,
         )
-        return result.stdout.strip()
+        return result.stdout.rstrip(b"\n").decode("ascii", "replace")
+
+    @staticmethod
+    def run_many(cmds: List[List[str]]) -> List[str]:
+        """
+        Run several commands in a single `sh -c` invocation (joined with &&)
+        and return the stdout of each command, in order.
+        """
+        if not cmds:
+            return []
+
+        separator = f" && printf '\\n%s\\n' {_SECTION_MARKER} && "
+        script = separator.join(shlex.join(cmd) for cmd in cmds)
+        output = Bash.run(["sh", "-c", script])
+        return [section.strip() for section in output.split(_SECTION_MARKER)]
 
 
 def run_wg_command(cmd: List[str]) -> str:
@@ -0,0 +1,40 @@
+import re
+from typing import Optional, Tuple
+
+# Dotted-quad IPv4 with an optional /prefix; everything else (IPv6, netmask
+# notation, ...) is left to the ipaddress module.
+_IPV4_CIDR = re.compile(
+    r"([0-9]{1,3})\.([0-9]{1,3})\.([0-9]{1,3})\.([0-9]{1,3})(?:/([0-9]{1,2}))?"
+)
+
+
+def parse_ipv4_cidr(value) -> Optional[Tuple[int, int]]:
+    """
+    Parse "a.b.c.d" or "a.b.c.d/nn" into (address, prefix) as integers.
+
+    Returns None when the value is not a plain, valid IPv4 interface, so the
+    caller can fall back to ipaddress.ip_interface() for the final verdict.
+    """
+    if not isinstance(value, str):
+        return None
+
+    match = _IPV4_CIDR.fullmatch(value)
+    if not match:
+        return None
+
+    address = 0
+    for octet in match.group(1, 2, 3, 4):
+        # ipaddress rejects leading zeros ("010") as ambiguous
+        if len(octet) > 1 and octet[0] == "0":
+            return None
+        number = int(octet)
+        if number > 255:
+            return None
+        address = (address << 8) | number
+
+    prefix = match.group(5)
+    prefix = 32 if prefix is None else int(prefix)
+    if prefix > 32:
+        return None
+
+    return address, prefix
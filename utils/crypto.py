@@ -1,14 +1,139 @@
-from cryptography.fernet import Fernet
+import base64
+import logging
+import os
+from functools import lru_cache
+from typing import Iterable, Union
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from django.conf import settings
-from typing import Union
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Token layout: base64url(version(1) || nonce(12) || ciphertext || tag(16))
+_VERSION = b"\x01"
+_NONCE_SIZE = 12
+_HKDF_INFO = b"wg-auto:aes-256-gcm"
+
+# Fernet tokens always start with the 0x80 version byte followed by a
+# big-endian timestamp, which base64-encodes to this prefix.
+_LEGACY_PREFIX = "gAAAAA"
+
+
+@lru_cache(maxsize=1)
+def _key() -> bytes:
+    """
+    ENCRYPTION_KEY read once, skipping LazySettings on every call.
+    """
+    return settings.ENCRYPTION_KEY
+
+
+@lru_cache(maxsize=1)
+def _has_aes_ni() -> bool | None:
+    """
+    Whether the CPU advertises AES-NI (None when it can't be determined).
+    OpenSSL picks the hardware path by itself; this is only for diagnostics.
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return " aes " in f"{line} "
+    except OSError:
+        pass
+    return None
+
+
+@lru_cache(maxsize=1)
+def _aesgcm(key: bytes) -> AESGCM:
+    """
+    Derive the AES-256 key from ENCRYPTION_KEY and build the cipher once, so
+    the key schedule is expanded a single time per process.
+    """
+    if _has_aes_ni() is False:
+        logger.warning("CPU lacks AES-NI; AES-GCM will use OpenSSL's software path")
+
+    derived = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=_HKDF_INFO,
+    ).derive(key)
+    return AESGCM(derived)
+
+
+@lru_cache(maxsize=1)
+def _fernet(key: bytes):
+    """
+    Build the Fernet instance once per key. Only used to read legacy tokens,
+    so the import is deferred until one is actually seen.
+    """
+    from cryptography.fernet import Fernet
+    return Fernet(key)
+
+
+@receiver(setting_changed)
+def _reset_key_cache(setting, **kwargs):
+    # Keep override_settings(ENCRYPTION_KEY=...) working in tests.
+    if setting == "ENCRYPTION_KEY":
+        _key.cache_clear()
+        _aesgcm.cache_clear()
+        _fernet.cache_clear()
+
 
 class CryptoService:
+    """
+    Symmetric encryption for secrets stored in the database.
+
+    New values are encrypted with AES-256-GCM. Tokens written by the previous
+    Fernet implementation are still decrypted and get upgraded the next time
+    the value is set.
+    """
+
     @staticmethod
     def encrypt(value: Union[str, bytes]) -> str:
         if isinstance(value, str):
             value = value.encode()
-        return Fernet(settings.ENCRYPTION_KEY).encrypt(value).decode()
+        nonce = os.urandom(_NONCE_SIZE)
+        ciphertext = _aesgcm(_key()).encrypt(nonce, value, None)
+        return base64.urlsafe_b64encode(_VERSION + nonce + ciphertext).decode()
+
+    @staticmethod
+    def encrypt_many(values: Iterable[Union[str, bytes]]) -> list[str]:
+        """
+        Encrypt several values with one cipher context and a single
+        os.urandom() call for all nonces. Used by bulk imports.
+        """
+        values = [v.encode() if isinstance(v, str) else v for v in values]
+        aesgcm = _aesgcm(_key())
+        nonces = os.urandom(_NONCE_SIZE * len(values))
+
+        tokens = []
+        for i, value in enumerate(values):
+            nonce = nonces[i * _NONCE_SIZE:(i + 1) * _NONCE_SIZE]
+            ciphertext = aesgcm.encrypt(nonce, value, None)
+            tokens.append(base64.urlsafe_b64encode(_VERSION + nonce + ciphertext).decode())
+        return tokens
+
+    @staticmethod
+    def is_legacy(value: str) -> bool:
+        """
+        Whether value is a Fernet token that should be re-encrypted.
+        """
+        return bool(value) and value.startswith(_LEGACY_PREFIX)
 
     @staticmethod
     def decrypt(value: str) -> str:
-        return Fernet(settings.ENCRYPTION_KEY).decrypt(value.encode()).decode()
+        if value.startswith(_LEGACY_PREFIX):
+            return _fernet(_key()).decrypt(value.encode()).decode()
+
+        raw = base64.urlsafe_b64decode(value)
+        if raw[:1] != _VERSION:
+            raise ValueError("Unsupported ciphertext version")
+
+        nonce = raw[1:1 + _NONCE_SIZE]
+        ciphertext = raw[1 + _NONCE_SIZE:]
+        return _aesgcm(_key()).decrypt(nonce, ciphertext, None).decode()
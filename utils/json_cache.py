@@ -0,0 +1,98 @@
+"""
+JSON values in Redis via orjson instead of Django's pickle serializer.
+
+Values are written straight through django-redis' raw client under the
+same key Django would use, so cache.delete() still invalidates them.
+Backends without a raw client (LocMem in tests) fall back to the normal
+cache API.
+"""
+import logging
+from contextlib import contextmanager
+
+import orjson
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def _raw_client(write: bool):
+    client = getattr(cache, "client", None)
+    if client is None or not hasattr(client, "get_client"):
+        return None
+    return client.get_client(write=write)
+
+
+def get_json(key: str):
+    """
+    Cached value for key, or None on a miss or a Redis error.
+    """
+    client = _raw_client(write=False)
+    if client is None:
+        return cache.get(key)
+
+    try:
+        raw = client.get(cache.make_key(key))
+    except Exception as exc:
+        logger.warning("Cache read failed for %s: %s", key, exc)
+        return None
+    return orjson.loads(raw) if raw is not None else None
+
+
+def set_json(key: str, value, timeout: int | None = None) -> None:
+    client = _raw_client(write=True)
+    if client is None:
+        cache.set(key, value, timeout=timeout)
+        return
+
+    try:
+        client.set(cache.make_key(key), orjson.dumps(value), ex=timeout)
+    except Exception as exc:
+        logger.warning("Cache write failed for %s: %s", key, exc)
+
+
+@contextmanager
+def build_lock(key: str, timeout: int = 10, wait: int = 5):
+    """
+    Serialize rebuilds of one cache key across processes (django-redis'
+    cache.lock). If the lock can't be taken within `wait` seconds, or the
+    backend has no locks, the block runs anyway so callers never stall.
+    """
+    make_lock = getattr(cache, "lock", None)
+    if make_lock is None:
+        yield
+        return
+
+    lock, acquired = None, False
+    try:
+        lock = make_lock(f"{key}:lock", timeout=timeout)
+        acquired = lock.acquire(blocking_timeout=wait)
+    except Exception as exc:
+        logger.warning("Cache lock failed for %s: %s", key, exc)
+
+    try:
+        yield
+    finally:
+        if acquired:
+            try:
+                lock.release()
+            except Exception:
+                # Expired while we held it; nothing left to release
+                pass
+
+
+def get_or_build_json(key: str, build, timeout: int | None = None):
+    """
+    get_json(key), or build() and store the result. Concurrent misses wait
+    for the first builder instead of all running build().
+    """
+    value = get_json(key)
+    if value is not None:
+        return value
+
+    with build_lock(key):
+        # Another process may have filled it while we waited
+        value = get_json(key)
+        if value is None:
+            value = build()
+            set_json(key, value, timeout=timeout)
+    return value
@@ -0,0 +1,34 @@
+"""
+WireGuard control over netlink (pyroute2) instead of the `wg` binary.
+
+Every peer change goes out as a netlink message on one socket, so syncing
+N peers costs no fork/exec at all. Requires CAP_NET_ADMIN and the optional
+`pyroute2` package, which is imported lazily.
+"""
+from typing import Iterable
+
+
+def is_available() -> bool:
+    try:
+        import pyroute2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def set_peers(interface: str, peers: Iterable[dict]) -> None:
+    """
+    Apply peer changes to a live interface.
+
+    Each peer dict uses pyroute2's keys, e.g.
+    {"public_key": ..., "allowed_ips": ["10.0.0.2/32"], "persistent_keepalive": 25}
+    or {"public_key": ..., "remove": True}.
+    """
+    from pyroute2 import WireGuard
+
+    wg = WireGuard()
+    try:
+        for peer in peers:
+            wg.set(interface, peer=peer)
+    finally:
+        wg.close()
@@ -1,8 +1,38 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
+# Management commands that never render the admin site.
+ADMINLESS_COMMANDS = {
+    "generate_wg_config",
+    "regenerate_server_keys",
+    "setup_wg_server",
+}
+
+
+def _needs_admin() -> bool:
+    """
+    Whether this process may serve the admin (runserver, gunicorn/wsgi,
+    shell, tests, ...). Only Celery and the admin-less CLI commands opt out.
+    """
+    program = os.path.basename(sys.argv[0]) if sys.argv else ""
+    if program == "celery":
+        return False
+    if program == "manage.py" and len(sys.argv) > 1:
+        return sys.argv[1] not in ADMINLESS_COMMANDS
+    return True
+
 
 class WireguardConfig(AppConfig):
     name = 'wireguard'
 
     def ready(self):
-        import wireguard.signals
\ No newline at end of file
+        # CLI tooling that never saves models can set WG_SKIP_SIGNALS=1 to
+        # avoid importing the signal/task graph at startup.
+        if not os.environ.get("WG_SKIP_SIGNALS"):
+            import wireguard.signals  # noqa: F401
+
+        if _needs_admin():
+            from .admin_registry import register
+            register()
@@ -1,4 +1,20 @@
 SMTP_SETTINGS_CACHE_KEY = "smtp_settings:v1"
-WG_ACTIVE_PEERS_CACHE_KEY = "wireguard_active_peers:v1"
-WG_SERVER_CACHE_KEY = "wireguard_server:v1"
-WG_SERVER_CONFIG_CACHE_KEY_PATTERN = "wireguard_server_config:{server_id}:v1"
+WG_ACTIVE_PEERS_VERSION_KEY = "wireguard_active_peers:version"
+WG_SERVER_CACHE_KEY = "wireguard_server:v2"
+WG_SERVER_IDS_CACHE_KEY = "wireguard_server_ids:v1"
+
+
+def wg_peer_state_key(peer_id) -> str:
+    return f"wireguard_peer_state:{peer_id}:v1"
+
+
+def wg_server_config_key(server_id) -> str:
+    return f"wireguard_server_config:{server_id}:v1"
+
+
+def wg_server_row_key(server_id) -> str:
+    return f"wireguard_server_row:{server_id}:v1"
+
+
+def wg_active_peers_key(version) -> str:
+    return f"wireguard_active_peers:{version}:v1"
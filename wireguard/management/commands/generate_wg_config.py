@@ -4,9 +4,17 @@
 Management command to generate /etc/wireguard/wg0.conf from database.
 Usage: sudo python manage.py generate_wg_config [--interface wg0] [--output /etc/wireguard/wg0.conf]
 """
+import io
 import os
 from django.core.management.base import BaseCommand, CommandError
-from wireguard.models import WireGuardServer, WireGuardPeer
+from wireguard.models import WireGuardServer
+
+PEER_TMPL = (
+    "[Peer]\n"
+    "# {name} ({platform})\n"
+    "PublicKey = {public_key}\n"
+    "AllowedIPs = {allowed_ip}\n"
+)
 
 
 class Command(BaseCommand):
@@ -47,12 +55,11 @@ class Command(BaseCommand):
                 f'Use "--interface {server.interface}" or update the server settings.'
             )
 
-        # Generate config
-        config = self.generate_config(server)
-
         if dry_run:
+            config = io.StringIO()
+            self.generate_config(server, config)
             self.stdout.write(self.style.SUCCESS('=== Generated WireGuard Config ===\n'))
-            self.stdout.write(config)
+            self.stdout.write(config.getvalue())
             self.stdout.write(
                 self.style.WARNING(
                     f'\n[DRY RUN] Would write to: {output_path}\n'
@@ -65,12 +72,20 @@ class Command(BaseCommand):
                 # Create directory if needed
                 os.makedirs(os.path.dirname(output_path), exist_ok=True)
                 
-                # Write config
-                with open(output_path, 'w') as f:
-                    f.write(config)
-                
-                # Set restrictive permissions (owner read/write only)
-                os.chmod(output_path, 0o600)
+                # Stream config into a temp file, then swap it in so a
+                # failure never leaves a truncated config behind
+                tmp_path = f'{output_path}.tmp'
+                try:
+                    # Restrictive permissions (owner read/write only) from the start
+                    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                    with os.fdopen(fd, 'w', buffering=1 << 16) as f:
+                        self.generate_config(server, f)
+
+                    os.replace(tmp_path, output_path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
                 
                 self.stdout.write(
                     self.style.SUCCESS(f'✓ Configuration written to: {output_path}')
@@ -85,6 +100,8 @@ class Command(BaseCommand):
                 self.stdout.write(f'2. Enable at boot: sudo systemctl enable wg-quick@{interface}')
                 self.stdout.write(f'3. Check status: sudo wg show')
                 
+            except CommandError:
+                raise
             except PermissionError:
                 raise CommandError(
                     f'Permission denied writing to {output_path}. '
@@ -94,9 +111,9 @@ class Command(BaseCommand):
                 raise CommandError(f'Error writing config: {e}')
 
     @staticmethod
-    def generate_config(server: WireGuardServer) -> str:
+    def generate_config(server: WireGuardServer, fh) -> None:
         """
-        Generate WireGuard interface configuration.
+        Write WireGuard interface configuration to the file-like object fh.
         """
         # Get private key
         try:
@@ -104,40 +121,42 @@ class Command(BaseCommand):
         except Exception as e:
             raise CommandError(f'Failed to decrypt server private key: {e}')
 
-        lines = [
-            '[Interface]',
-            f'Address = {server.server_address}',
-            f'ListenPort = {server.port}',
-            f'PrivateKey = {private_key}',
-        ]
+        fh.write(
+            '[Interface]\n'
+            f'Address = {server.server_address}\n'
+            f'ListenPort = {server.port}\n'
+            f'PrivateKey = {private_key}\n'
+        )
 
         # Add DNS if configured
         if server.dns:
             dns_servers = ', '.join([d.strip() for d in server.dns.split(',')])
-            lines.append(f'DNS = {dns_servers}')
+            fh.write(f'DNS = {dns_servers}\n')
 
         # Add MTU if not default
         if server.mtu != 1420:
-            lines.append(f'MTU = {server.mtu}')
+            fh.write(f'MTU = {server.mtu}\n')
 
         # Add peers
         peers = server.peers.filter(is_active=True)
         if peers.exists():
-            lines.append('')
-            lines.append('# Active Peers')
-            lines.append('')
-            
-            for peer in peers:
-                lines.append('[Peer]')
-                lines.append(f'# {peer.name} ({peer.platform})')
-                lines.append(f'PublicKey = {peer.public_key}')
-                lines.append(f'AllowedIPs = {peer.allowed_ip}')
-                
-                if peer.persistent_keepalive:
-                    lines.append(f'PersistentKeepalive = {peer.persistent_keepalive}')
-                
-                lines.append('')
+            fh.write('\n# Active Peers\n\n')
+
+            keepalive = (
+                f'PersistentKeepalive = {server.persistent_keepalive}\n'
+                if server.persistent_keepalive else ''
+            )
+            rows = peers.only(
+                'name', 'platform', 'public_key', 'allowed_ip',
+            ).iterator(chunk_size=500)
+            for peer in rows:
+                fh.write(PEER_TMPL.format(
+                    name=peer.name,
+                    platform=peer.platform,
+                    public_key=peer.public_key,
+                    allowed_ip=peer.allowed_ip,
+                ))
+                fh.write(keepalive)
+                fh.write('\n')
 
-        lines.append('# End of WireGuard configuration')
-        
-        return '\n'.join(lines)
+        fh.write('# End of WireGuard configuration')
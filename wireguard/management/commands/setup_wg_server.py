@@ -5,6 +5,7 @@ Management command to create or update WireGuard server configuration.
 Usage: python manage.py setup_wg_server
 """
 from django.core.management.base import BaseCommand
+from utils.crypto import CryptoService
 from wireguard.models import WireGuardServer
 from wireguard.services.wireguard import WireGuardService
 import json
@@ -57,33 +58,23 @@ class Command(BaseCommand):
         private_key, public_key = WireGuardService.generate_keys()
         self.stdout.write(self.style.SUCCESS("✓ Keys generated"))
 
-        # Create or update server
-        if server:
-            server.name = name
-            server.endpoint = endpoint
-            server.server_address = address
-            server.interface = interface
-            server.port = port
-            server.dns = dns
-            server.mtu = mtu
-            server.public_key = public_key
-            server.set_private_key(private_key)
-            server.save()
-            self.stdout.write(self.style.SUCCESS(f"✓ Updated server: {server.name}"))
-        else:
-            server = WireGuardServer.objects.create(
-                name=name,
-                endpoint=endpoint,
-                server_address=address,
-                interface=interface,
-                port=port,
-                dns=dns,
-                mtu=mtu,
-                public_key=public_key,
-            )
-            server.set_private_key(private_key)
-            server.save()
-            self.stdout.write(self.style.SUCCESS(f"✓ Created server: {server.name}"))
+        # Create or update server in a single write
+        server, created = WireGuardServer.objects.update_or_create(
+            pk=server.pk if server else None,
+            defaults={
+                'name': name,
+                'endpoint': endpoint,
+                'server_address': address,
+                'interface': interface,
+                'port': port,
+                'dns': dns,
+                'mtu': mtu,
+                'public_key': public_key,
+                'private_key_encrypted': CryptoService.encrypt(private_key),
+            }
+        )
+        action = "Created" if created else "Updated"
+        self.stdout.write(self.style.SUCCESS(f"✓ {action} server: {server.name}"))
 
         # Display summary
         self.stdout.write(self.style.SUCCESS('\n=== Server Configuration ==='))
@@ -123,10 +114,9 @@ class Command(BaseCommand):
                 'port': port,
                 'dns': dns,
                 'public_key': public_key,
+                'private_key_encrypted': CryptoService.encrypt(private_key),
             }
         )
-        server.set_private_key(private_key)
-        server.save()
 
         action = "Created" if created else "Updated"
         self.stdout.write(self.style.SUCCESS(f"✓ {action} server: {server.name}"))
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-15 01:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wireguard', '0010_wireguardserver_uplink_interface'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='wireguardpeer',
+            constraint=models.UniqueConstraint(fields=('server', 'allowed_ip'), name='uniq_peer_ip_per_server'),
+        ),
+    ]
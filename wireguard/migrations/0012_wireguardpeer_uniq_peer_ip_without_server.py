@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-15 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wireguard', '0011_wireguardpeer_uniq_peer_ip_per_server'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='wireguardpeer',
+            constraint=models.UniqueConstraint(condition=models.Q(('server__isnull', True)), fields=('allowed_ip',), name='uniq_peer_ip_without_server'),
+        ),
+    ]
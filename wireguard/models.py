@@ -1,17 +1,133 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.utils.functional import cached_property
 
+import hashlib
 import ipaddress
+import logging
+import time
+import weakref
 
+from utils.cidr import parse_ipv4_cidr
 from utils.crypto import CryptoService
 from .constants import (
     SMTP_SETTINGS_CACHE_KEY,
-    WG_ACTIVE_PEERS_CACHE_KEY,
+    WG_ACTIVE_PEERS_VERSION_KEY,
     WG_SERVER_CACHE_KEY,
-    WG_SERVER_CONFIG_CACHE_KEY_PATTERN,
+    WG_SERVER_IDS_CACHE_KEY,
+    wg_peer_state_key,
+    wg_server_config_key,
+    wg_server_row_key,
 )
 
+logger = logging.getLogger(__name__)
+
+
+def active_peers_version() -> int:
+    """
+    Current generation of the active-peers cache. The counter starts from
+    the clock, so a counter lost to eviction never comes back at a value
+    whose cached list is still around.
+    """
+    version = cache.get(WG_ACTIVE_PEERS_VERSION_KEY)
+    if version is None:
+        cache.add(WG_ACTIVE_PEERS_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(WG_ACTIVE_PEERS_VERSION_KEY, 0)
+    return version
+
+
+def _bump_active_peers_version():
+    try:
+        active_peers_version()
+        cache.incr(WG_ACTIVE_PEERS_VERSION_KEY)
+    except ValueError:
+        # Evicted between the read and incr(); start a new generation
+        cache.set(WG_ACTIVE_PEERS_VERSION_KEY, time.time_ns(), timeout=None)
+    except Exception as exc:
+        logger.warning("Could not bump active peers cache version: %s", exc)
+
+
+def invalidate_active_peers():
+    """
+    Move the active-peers cache to a new version once the current
+    transaction commits. The previous entry is left to expire instead of
+    being deleted. Repeat calls inside the same transaction schedule a
+    single bump.
+    """
+    connection = transaction.get_connection()
+
+    # The connection keeps only a weak reference to the pending callback:
+    # it clears itself when it runs, and dies with the callback when a
+    # rollback discards it, so a stale flag never suppresses a bump.
+    pending = getattr(connection, "_active_peers_bump", None)
+    if pending is not None and pending() is not None:
+        return
+
+    def bump():
+        connection._active_peers_bump = None
+        _bump_active_peers_version()
+
+    connection._active_peers_bump = weakref.ref(bump)
+    transaction.on_commit(bump)
+
+
+# Peer fields that end up on the live interface
+LIVE_PEER_FIELDS = frozenset({"public_key", "allowed_ip", "is_active", "server"})
+
+
+def live_state_digest(public_key, allowed_ip, is_active, server_id) -> str:
+    state = (public_key, allowed_ip, is_active, server_id)
+    return hashlib.sha1(repr(state).encode()).hexdigest()
+
+
+def remember_live_state(digests: dict) -> None:
+    """
+    Record {peer_id: live_state_digest} for peers just applied to the
+    interface. Only written once the apply succeeded, so a failed sync
+    leaves the old digest and the next save retries it.
+    """
+    try:
+        cache.set_many({wg_peer_state_key(pk): d for pk, d in digests.items()}, timeout=None)
+    except Exception as exc:
+        logger.warning("Could not record live peer state: %s", exc)
+
+
+def forget_live_state(peer_ids) -> None:
+    try:
+        cache.delete_many([wg_peer_state_key(pk) for pk in peer_ids])
+    except Exception as exc:
+        logger.warning("Could not drop live peer state: %s", exc)
+
+
+def _upgrade_legacy_key(instance, save_kwargs: dict) -> None:
+    """
+    Re-encrypt a private key still stored as a legacy Fernet token, so
+    every row moves to AES-GCM the next time it is saved. A save limited
+    by update_fields writes the upgraded column as well.
+    """
+    if not CryptoService.is_legacy(instance.private_key_encrypted):
+        return
+
+    instance.set_private_key(instance.get_private_key())
+    update_fields = save_kwargs.get("update_fields")
+    if update_fields:
+        save_kwargs["update_fields"] = {*update_fields, "private_key_encrypted"}
+
+
+def _decrypt_memoized(instance) -> str:
+    """
+    Decrypted private key, memoized per instance and keyed on the current
+    ciphertext, so set_private_key(), refresh_from_db() or assigning
+    private_key_encrypted directly can never leave a stale plaintext.
+    """
+    ciphertext = instance.private_key_encrypted
+    memo = instance.__dict__.get("_plaintext_private_key")
+    if memo is None or memo[0] != ciphertext:
+        memo = (ciphertext, CryptoService.decrypt(ciphertext))
+        instance.__dict__["_plaintext_private_key"] = memo
+    return memo[1]
+
 
 # ============================================================
 # Validators
@@ -19,6 +135,10 @@ from .constants import (
 
 def validate_cidr(value):
     """Validate that the input is a valid IP/CIDR (IPv4 or IPv6)."""
+    # Plain IPv4 (the common case) is checked without building ipaddress objects
+    if parse_ipv4_cidr(value) is not None:
+        return
+
     try:
         ipaddress.ip_interface(value)
     except ValueError:
@@ -116,13 +236,15 @@ class WireGuardServer(models.Model):
         self.private_key_encrypted = CryptoService.encrypt(key)
 
     def get_private_key(self) -> str:
-        return CryptoService.decrypt(self.private_key_encrypted)
+        return _decrypt_memoized(self)
 
     # --------------------------------------------------------
     # Save override (AUTO-GENERATES KEYS)
     # --------------------------------------------------------
 
     def save(self, *args, **kwargs):
+        # services.wireguard imports this module, so this can't be hoisted;
+        # after the first call it is only a sys.modules lookup
         from .services.wireguard import WireGuardService
 
         private_key_missing = not self.private_key_encrypted
@@ -137,6 +259,7 @@ class WireGuardServer(models.Model):
 
                 self.public_key = public_key
                 self.set_private_key(private_key)
+                logger.debug("Generated keys for WireGuard server %s", self.name)
 
             except Exception as exc:
                 # ❌ NEVER save a server without valid keys
@@ -144,36 +267,64 @@ class WireGuardServer(models.Model):
                     f"Cannot save WireGuard server '{self.name}' without valid keys"
                 ) from exc
 
+        _upgrade_legacy_key(self, kwargs)
         super().save(*args, **kwargs)
 
-        # Cache invalidation (non-fatal)
+        # After COMMIT, so a rolled-back save never reaches the cache
+        transaction.on_commit(self._refresh_cache)
+
+    def _refresh_cache(self):
+        # Non-fatal: drop the default-server entry and store the fresh
+        # config dict so to_dict() never has to rebuild it
         try:
-            cache.delete(WG_SERVER_CACHE_KEY)
-            cache.delete(
-                WG_SERVER_CONFIG_CACHE_KEY_PATTERN.format(server_id=self.id)
-            )
-        except Exception:
-            pass
+            cache.delete_many([WG_SERVER_CACHE_KEY, wg_server_row_key(self.id)])
+            self._rebuild_and_cache()
+
+            # A new server rebuilds the id set from the DB; patching it in
+            # place could drop an id saved concurrently
+            if self.id not in self.cached_ids():
+                self.cached_ids(rebuild=True)
+        except Exception as exc:
+            logger.warning("Could not refresh cache for server %s: %s", self.id, exc)
+
+    @classmethod
+    def cached_ids(cls, rebuild: bool = False) -> set[int]:
+        """
+        Ids of all servers, so invalidation needs no table scan on a warm
+        cache. The set can be evicted on its own, so a miss is rebuilt
+        from the DB rather than treated as "no servers".
+        """
+        ids = None if rebuild else cache.get(WG_SERVER_IDS_CACHE_KEY)
+        if ids is None:
+            ids = set(cls.objects.values_list("id", flat=True))
+            cache.set(WG_SERVER_IDS_CACHE_KEY, ids, timeout=None)
+        return ids
 
     # --------------------------------------------------------
 
     @classmethod
     def get_default(cls):
-        cached = cache.get(WG_SERVER_CACHE_KEY)
-        if cached:
-            return cached
+        # The pk is cached and the row comes from get_server_cached(), so
+        # a warm cache answers without a query
+        pk = cache.get(WG_SERVER_CACHE_KEY)
+        if pk is not None:
+            try:
+                return get_server_cached(pk)
+            except cls.DoesNotExist:
+                cache.delete(WG_SERVER_CACHE_KEY)
+
+        pk = cls.objects.filter(is_active=True).values_list("id", flat=True).first()
+        if pk is None:
+            return None
 
-        server = cls.objects.filter(is_active=True).first()
-        if server:
-            cache.set(WG_SERVER_CACHE_KEY, server, timeout=None)
-        return server
+        cache.set(WG_SERVER_CACHE_KEY, pk, timeout=None)
+        return get_server_cached(pk)
 
     def to_dict(self) -> dict:
-        cache_key = WG_SERVER_CONFIG_CACHE_KEY_PATTERN.format(server_id=self.id)
-        cached = cache.get(cache_key)
-        if cached:
-            return cached
+        cache_key = wg_server_config_key(self.id)
+        return cache.get(cache_key) or self._rebuild_and_cache()
 
+    def _rebuild_and_cache(self) -> dict:
         config = {
             "id": self.id,
             "name": self.name,
@@ -189,7 +340,11 @@ class WireGuardServer(models.Model):
             "is_active": self.is_active,
         }
 
-        cache.set(cache_key, config, timeout=None)
+        cache.set(
+            wg_server_config_key(self.id),
+            config,
+            timeout=None,
+        )
         return config
 
     class Meta:
@@ -202,10 +357,76 @@ class WireGuardServer(models.Model):
         ]
 
 
+# ============================================================
+# Server row cache
+# ============================================================
+
+def get_server_cached(server_id: int) -> WireGuardServer:
+    """
+    WireGuardServer by id without a query on a warm cache. The column
+    values are cached (not a pickled instance) and cleared by
+    WireGuardServer.save() and the server post_delete signal.
+
+    Raises WireGuardServer.DoesNotExist like objects.get().
+    """
+    fields = [f.attname for f in WireGuardServer._meta.concrete_fields]
+    key = wg_server_row_key(server_id)
+
+    row = cache.get(key)
+    if row is None:
+        row = WireGuardServer.objects.filter(id=server_id).values(*fields).first()
+        if row is None:
+            raise WireGuardServer.DoesNotExist(f"WireGuardServer {server_id} not found")
+        cache.set(key, row, timeout=None)
+
+    return WireGuardServer.from_db(None, fields, [row[name] for name in fields])
+
+
 # ============================================================
 # WireGuard Peer
 # ============================================================
 
+class WireGuardPeerQuerySet(models.QuerySet):
+    def for_config_render(self):
+        """
+        Plain dict rows with only the columns config rendering reads, plus
+        the server endpoint they fall back to, in a single query.
+        """
+        return self.values(
+            "id",
+            "name",
+            "email",
+            "public_key",
+            "private_key_encrypted",
+            "allowed_ip",
+            "platform",
+            "server_id",
+            "server_endpoint",
+            "updated_at",
+            "server__endpoint",
+        )
+
+    def update(self, **kwargs):
+        """
+        QuerySet.update() skips save() and the peer signals, so the
+        active-peers cache is invalidated here. The live interface is not
+        touched; callers changing is_active, allowed_ip or public_key
+        this way must queue sync_peers_bulk for the affected servers.
+        Their recorded live state is dropped so the next save of each
+        peer is synced again.
+        """
+        peer_ids = None
+        if LIVE_PEER_FIELDS & {name.removesuffix("_id") for name in kwargs}:
+            peer_ids = list(self.values_list("id", flat=True))
+
+        rows = super().update(**kwargs)
+        if rows:
+            invalidate_active_peers()
+        if peer_ids:
+            forget_live_state(peer_ids)
+        return rows
+
+
 class WireGuardPeer(models.Model):
     PLATFORM_CHOICES = [
         ("android", "Android"),
@@ -253,6 +474,8 @@ class WireGuardPeer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = WireGuardPeerQuerySet.as_manager()
+
     # --------------------------------------------------------
 
     def __str__(self):
@@ -261,20 +484,25 @@ class WireGuardPeer(models.Model):
     def get_server(self):
         return self.server or WireGuardServer.get_default()
 
+    @cached_property
+    def _effective_server(self):
+        """
+        get_server() resolved once per instance, so rendering a config does
+        not repeat the FK/default-server lookup for every field.
+        """
+        return self.get_server()
+
     def get_endpoint(self):
-        return self.server_endpoint or (
-            self.get_server().endpoint if self.get_server() else ""
-        )
+        server = self._effective_server
+        return self.server_endpoint or (server.endpoint if server else "")
 
     def get_dns(self):
-        return self.dns or (
-            self.get_server().dns if self.get_server() else ""
-        )
+        server = self._effective_server
+        return self.dns or (server.dns if server else "")
 
     def get_allowed_ips(self):
-        return self.allowed_ips or (
-            self.get_server().allowed_ips if self.get_server() else ""
-        )
+        server = self._effective_server
+        return self.allowed_ips or (server.allowed_ips if server else "")
 
     # --------------------------------------------------------
     # Key helpers
@@ -284,17 +512,47 @@ class WireGuardPeer(models.Model):
         self.private_key_encrypted = CryptoService.encrypt(key)
 
     def get_private_key(self) -> str:
-        return CryptoService.decrypt(self.private_key_encrypted)
+        return _decrypt_memoized(self)
 
     # --------------------------------------------------------
 
+    def clean(self):
+        super().clean()
+        # Checked against the effective server: save() pins an unassigned
+        # peer to the default, where the unique constraint would only
+        # fire as an IntegrityError
+        server = self.server or WireGuardServer.get_default()
+        if server is None or not self.allowed_ip:
+            return
+
+        clash = (
+            WireGuardPeer.objects.filter(server=server, allowed_ip=self.allowed_ip)
+            .exclude(pk=self.pk)
+            .exists()
+        )
+        if clash:
+            raise ValidationError({
+                "allowed_ip": f"{self.allowed_ip} is already used by another peer on {server.name}."
+            })
+
     def save(self, *args, **kwargs):
+        # Unassigned peers get the default server now rather than during
+        # onboarding, so uniq_peer_ip_per_server covers them from the start
+        if self.server_id is None:
+            default = WireGuardServer.get_default()
+            if default is not None:
+                self.server = default
+                update_fields = kwargs.get("update_fields")
+                if update_fields:
+                    kwargs["update_fields"] = {*update_fields, "server"}
+
+        _upgrade_legacy_key(self, kwargs)
         super().save(*args, **kwargs)
-        cache.delete(WG_ACTIVE_PEERS_CACHE_KEY)
+        invalidate_active_peers()
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
-        cache.delete(WG_ACTIVE_PEERS_CACHE_KEY)
+        invalidate_active_peers()
 
     class Meta:
         ordering = ["-created_at"]
@@ -305,3 +563,16 @@ class WireGuardPeer(models.Model):
             models.Index(fields=["allowed_ip"]),
             models.Index(fields=["is_active"]),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["server", "allowed_ip"],
+                name="uniq_peer_ip_per_server",
+            ),
+            # NULLs never compare equal, so peers left without a server (no
+            # default existed) need their own constraint
+            models.UniqueConstraint(
+                fields=["allowed_ip"],
+                condition=models.Q(server__isnull=True),
+                name="uniq_peer_ip_without_server",
+            ),
+        ]
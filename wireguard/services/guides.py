@@ -1,6 +1,10 @@
 from dataclasses import dataclass
-from django.template.loader import render_to_string
-import markdown  # new import
+from django.template import engines
+from django.template.loader import get_template
+import mistune
+
+# Built once; the parser's compiled rules are reused for every guide
+_md = mistune.create_markdown(escape=False, plugins=["table"])
 
 @dataclass
 class GuideContext:
@@ -24,28 +28,33 @@ class InstallationGuideService:
         "macos",
     ]
 
+    # platform -> HTML template compiled from the Markdown source
+    _compiled = {}
+
+    @classmethod
+    def _get_template(cls, platform: str):
+        """
+        Convert the platform's Markdown template to HTML once per process and
+        keep the resulting Django template, so rendering a guide is only
+        variable substitution.
+        """
+        template = cls._compiled.get(platform)
+        if template is None:
+            source = get_template(f"wireguard/guides/{platform}.md").template.source
+            html_source = _md(source)
+            template = cls._compiled[platform] = engines["django"].from_string(html_source)
+        return template
+
     @classmethod
     def generate(cls, context: GuideContext) -> str:
         if context.platform not in cls.SUPPORTED_PLATFORMS:
             raise ValueError(f"Unsupported platform: {context.platform}")
 
-        template = f"wireguard/guides/{context.platform}.md"
-
-        # Render Markdown template as plain text first
-        markdown_content = render_to_string(
-            template,
+        return cls._get_template(context.platform).render(
             {
                 "peer": context.peer_name,
                 "endpoint": context.server_endpoint,
                 "allowed_ips": context.allowed_ips,
                 "dns": context.dns,
-            },
-        )
-
-        # Convert Markdown to HTML
-        html_content = markdown.markdown(
-            markdown_content, 
-            extensions=["fenced_code", "tables"]
+            }
         )
-
-        return html_content
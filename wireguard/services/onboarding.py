@@ -1,14 +1,13 @@
 import logging
 import os
 import ipaddress
-import markdown  # Added for Markdown to HTML conversion
 
 from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 
 from .guides import InstallationGuideService, GuideContext
 from .wireguard import WireGuardService
-from .qr import generate_qr
+from .qr import QR_CONTENT_TYPES, generate_qr
 from .server import WireGuardServerService
 
 logger = logging.getLogger(__name__)
@@ -128,14 +127,17 @@ def generate_server_config(server, private_key: str) -> str:
 # ============================================================
 
 def onboard(peer_id: int):
-    """Full peer onboarding workflow: assign server, generate keys, config, QR, send email."""
+    """
+    Full peer onboarding workflow: assign server, generate keys, config, QR, send email.
+    Returns the onboarded peer with its server attached.
+    """
     from wireguard.models import WireGuardPeer
     from wireguard.services.email import get_smtp_settings
 
     logger.info("Starting onboarding for peer %s", peer_id)
 
     try:
-        peer = WireGuardPeer.objects.get(id=peer_id)
+        peer = WireGuardPeer.objects.select_related("server").get(id=peer_id)
     except WireGuardPeer.DoesNotExist:
         logger.error("Peer %s not found", peer_id)
         raise
@@ -169,13 +171,13 @@ def onboard(peer_id: int):
     smtp = get_smtp_settings(force_reload=True)
     if not smtp:
         logger.warning("SMTP not configured — skipping email for peer %s", peer.name)
-        return
+        return peer
 
     try:
         endpoint = f"{server.endpoint.split(':')[0]}:{server.port}"
 
-        # Generate HTML guide from Markdown
-        guide_markdown = InstallationGuideService.generate(
+        # Installation guide (already rendered to HTML)
+        guide_html = InstallationGuideService.generate(
             GuideContext(
                 peer_name=peer.name,
                 server_endpoint=endpoint,
@@ -185,12 +187,6 @@ def onboard(peer_id: int):
             )
         )
 
-        # Ensure Markdown is converted to proper HTML
-        guide_html = markdown.markdown(
-            guide_markdown,
-            extensions=["fenced_code", "tables"]
-        )
-
         html_body = render_to_string(
             "wireguard/emails/onboarding.html",
             {
@@ -198,7 +194,7 @@ def onboard(peer_id: int):
                 "endpoint": endpoint,
                 "allowed_ips": peer.get_allowed_ips(),
                 "dns": peer.get_dns(),
-                "guide": guide_html,  # HTML now, not raw Markdown
+                "guide": guide_html,
                 "server_name": server.name,
             }
         )
@@ -225,11 +221,13 @@ def onboard(peer_id: int):
         email.attach(conf_filename, conf_content, "text/plain")
 
         if qr_path and os.path.exists(qr_path):
+            ext = os.path.splitext(qr_path)[1].lstrip(".")
             with open(qr_path, "rb") as f:
-                email.attach(f"qr_{peer.id}.png", f.read(), "image/png")
+                email.attach(f"qr_{peer.id}.{ext}", f.read(), QR_CONTENT_TYPES.get(ext, "application/octet-stream"))
 
         sent = email.send()
         logger.info("Onboarding email sent to %s (result=%s)", peer.email, sent)
+        return peer
 
     except Exception as e:
         logger.exception("Failed to send onboarding email to peer %s: %s", peer.name, e)
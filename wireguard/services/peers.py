@@ -0,0 +1,81 @@
+# wireguard/services/peers.py
+"""
+Peer creation for bulk paths.
+
+bulk_create() skips post_save, so instead of relying on the peer signals
+this queues one onboarding task for the whole batch. Code that saves
+peers itself and queues its own follow-up work can silence the peer
+receivers with suppress_peer_signals().
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from utils.crypto import CryptoService
+from wireguard.models import WireGuardPeer, WireGuardServer, invalidate_active_peers
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+@contextmanager
+def suppress_peer_signals():
+    """
+    Skip the WireGuardPeer post_save/post_delete receivers in this thread.
+    """
+    previous = getattr(_local, "suppressed", False)
+    _local.suppressed = True
+    try:
+        yield
+    finally:
+        _local.suppressed = previous
+
+
+def peer_signals_suppressed() -> bool:
+    return getattr(_local, "suppressed", False)
+
+
+def create_peers(data_list, batch_size: int = 500) -> list[WireGuardPeer]:
+    """
+    Create peers from dicts of field values with one INSERT per batch and
+    queue a single bulk_onboard_peers task once the transaction commits.
+
+    A dict may carry a plaintext "private_key"; those are encrypted in one
+    pass via CryptoService.encrypt_many. Peers without one get their keys
+    during onboarding.
+    """
+    from wireguard.tasks import bulk_onboard_peers
+
+    data_list = [dict(data) for data in data_list]
+    with_keys = [data for data in data_list if data.get("private_key")]
+    encrypted = CryptoService.encrypt_many(data.pop("private_key") for data in with_keys)
+    for data, token in zip(with_keys, encrypted):
+        data["private_key_encrypted"] = token
+    # bulk_create() skips save(), which pins unassigned peers to the default
+    default = WireGuardServer.get_default()
+    for data in data_list:
+        data.pop("private_key", None)
+        if default is not None and not (data.get("server") or data.get("server_id")):
+            data["server"] = default
+
+    peers = WireGuardPeer.objects.bulk_create(
+        [WireGuardPeer(**data) for data in data_list],
+        batch_size=batch_size,
+    )
+    # bulk_create() bypasses save()
+    invalidate_active_peers()
+
+    peer_ids = [peer.id for peer in peers]
+    if peer_ids:
+        def enqueue():
+            # The rows are committed; a broker outage must not fail the caller
+            try:
+                bulk_onboard_peers.delay(peer_ids)
+            except Exception as e:
+                logger.error("Failed to queue onboarding for %d peers: %s", len(peer_ids), e)
+
+        transaction.on_commit(enqueue)
+    return peers
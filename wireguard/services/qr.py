@@ -1,8 +1,11 @@
 # wireguard/services/qr.py
 import os
-import qrcode
+import time
+import segno
 from django.conf import settings
-from django.utils import timezone
+
+# year -> QR directory; one join per year instead of per QR
+_year_dir_cache: dict[int, str] = {}
 
 
 def get_qr_base_dir() -> str:
@@ -10,31 +13,44 @@ def get_qr_base_dir() -> str:
 
 
 def get_year_dir() -> str:
-    year = timezone.now().year
-    return os.path.join(get_qr_base_dir(), str(year))
+    year = time.gmtime().tm_year
+    year_dir = _year_dir_cache.get(year)
+    if year_dir is None:
+        year_dir = _year_dir_cache[year] = os.path.join(get_qr_base_dir(), str(year))
+    return year_dir
+
+
+QR_CONTENT_TYPES = {
+    "svg": "image/svg+xml",
+    "png": "image/png",
+}
+
+
+def get_qr_format() -> str:
+    fmt = getattr(settings, "WIREGUARD_QR_FORMAT", "svg")
+    return fmt if fmt in QR_CONTENT_TYPES else "svg"
 
 
 def generate_qr(peer_id: str, config_text: str) -> str:
     """
     Generate a WireGuard QR code stored in a year-based directory.
-    Returns the absolute path to the QR file.
+    Returns the absolute path to the QR file (SVG unless
+    WIREGUARD_QR_FORMAT is "png").
     """
     year_dir = get_year_dir()
     os.makedirs(year_dir, exist_ok=True)
 
-    filename = f"peer_{peer_id}.png"
+    fmt = get_qr_format()
+    filename = f"peer_{peer_id}.{fmt}"
     file_path = os.path.join(year_dir, filename)
 
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=8,
-        border=4,
-    )
-    qr.add_data(config_text)
-    qr.make(fit=True)
-
-    img = qr.make_image(fill_color="black", back_color="white")
-    img.save(file_path)
+    qr = segno.make_qr(config_text, error="l", boost_error=False)
+    if fmt == "svg":
+        # Plain text output, no raster encoding or deflate at all
+        qr.save(file_path, kind="svg", scale=8, border=4, dark="black", light="white")
+    else:
+        # compresslevel=1: QR bitmaps compress well anyway, and fast deflate
+        # keeps the PNG write cheap
+        qr.save(file_path, scale=8, border=4, dark="black", light="white", compresslevel=1)
 
     return file_path
@@ -5,7 +5,11 @@ WireGuard Server management service with caching.
 from django.core.cache import cache
 from django.utils import timezone
 from wireguard.models import WireGuardServer
-from wireguard.constants import WG_SERVER_CACHE_KEY, WG_SERVER_CONFIG_CACHE_KEY_PATTERN
+from wireguard.constants import (
+    WG_SERVER_CACHE_KEY,
+    wg_server_config_key,
+    wg_server_row_key,
+)
 
 
 class WireGuardServerService:
@@ -28,9 +32,12 @@ class WireGuardServerService:
         Get server configuration as dictionary.
         Results are cached.
         """
+        cached = cache.get(wg_server_config_key(server_id))
+        if cached:
+            return cached
+
         try:
-            server = WireGuardServer.objects.get(id=server_id)
-            return server.to_dict()
+            return WireGuardServer.objects.get(id=server_id)._rebuild_and_cache()
         except WireGuardServer.DoesNotExist:
             return None
 
@@ -49,12 +56,14 @@ class WireGuardServerService:
         Otherwise invalidates all server caches.
         """
         if server_id:
-            cache.delete(WG_SERVER_CONFIG_CACHE_KEY_PATTERN.format(server_id=server_id))
+            cache.delete_many([wg_server_config_key(server_id), wg_server_row_key(server_id)])
         else:
-            cache.delete(WG_SERVER_CACHE_KEY)
-            # Invalidate all server configs (limited to ~100 servers)
-            for server in WireGuardServer.objects.all():
-                cache.delete(WG_SERVER_CONFIG_CACHE_KEY_PATTERN.format(server_id=server.id))
+            # Cached id set; rebuilt from the DB if it was evicted
+            cache.delete_many([WG_SERVER_CACHE_KEY] + [
+                key
+                for server_id in WireGuardServer.cached_ids()
+                for key in (wg_server_config_key(server_id), wg_server_row_key(server_id))
+            ])
 
     @staticmethod
     def get_server_stats(server: WireGuardServer) -> dict:
@@ -3,3 +3,7 @@ from utils.bash import Bash
 def test_bash_echo():
     out = Bash.run(["echo", "hello"])
     assert out == "hello"
+
+def test_bash_run_many():
+    out = Bash.run_many([["echo", "a"], ["echo", "b"]])
+    assert out == ["a", "b"]
@@ -0,0 +1,16 @@
+import ipaddress
+
+from utils.cidr import parse_ipv4_cidr
+
+def test_parse_ipv4_cidr():
+    assert parse_ipv4_cidr("10.0.0.1/24") == (0x0A000001, 24)
+    assert parse_ipv4_cidr("10.0.0.1") == (0x0A000001, 32)
+
+def test_parse_ipv4_cidr_defers_to_ipaddress():
+    for value in ["256.0.0.1/24", "10.0.0.1/33", "010.0.0.1", "fd00::1/64", "10.0.0.1/255.255.255.0"]:
+        assert parse_ipv4_cidr(value) is None
+
+def test_parse_ipv4_cidr_never_accepts_what_ipaddress_rejects():
+    for value in ["1.2.3.4/08", "0.0.0.0/0", "255.255.255.255/32", "1.2.3.04", "1.2.3.4/"]:
+        if parse_ipv4_cidr(value) is not None:
+            ipaddress.ip_interface(value)
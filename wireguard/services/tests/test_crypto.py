@@ -1,6 +1,18 @@
+from cryptography.fernet import Fernet
+from django.conf import settings
+
 from utils.crypto import CryptoService
 
 def test_encrypt_decrypt():
     raw = "secret"
     enc = CryptoService.encrypt(raw)
     assert CryptoService.decrypt(enc) == raw
+
+def test_decrypt_legacy_fernet_token():
+    token = Fernet(settings.ENCRYPTION_KEY).encrypt(b"secret").decode()
+    assert CryptoService.decrypt(token) == "secret"
+
+def test_encrypt_many():
+    tokens = CryptoService.encrypt_many(["a", "b"])
+    assert [CryptoService.decrypt(t) for t in tokens] == ["a", "b"]
+    assert tokens[0] != CryptoService.encrypt_many(["a"])[0]
@@ -1,5 +1,5 @@
 import pytest
-from wireguard_app.services.guides import InstallationGuideService, GuideContext
+from wireguard.services.guides import InstallationGuideService, GuideContext
 
 
 @pytest.mark.django_db
@@ -0,0 +1,33 @@
+from unittest import mock
+
+import utils.json_cache as json_cache
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+
+def test_json_roundtrip_through_raw_client():
+    redis = FakeRedis()
+    client = mock.Mock(get_client=lambda write=True: redis)
+
+    with mock.patch.object(json_cache.cache, "client", client, create=True):
+        json_cache.set_json("peers", [{"id": 1, "server_id": None}])
+        assert json_cache.get_json("peers") == [{"id": 1, "server_id": None}]
+        assert json_cache.get_json("missing") is None
+
+    assert redis.store[json_cache.cache.make_key("peers")] == b'[{"id":1,"server_id":null}]'
+
+def test_get_or_build_json_builds_once():
+    json_cache.cache.delete("built")
+    calls = []
+    build = lambda: calls.append(1) or []
+
+    assert json_cache.get_or_build_json("built", build) == []
+    assert json_cache.get_or_build_json("built", build) == []
+    assert len(calls) == 1
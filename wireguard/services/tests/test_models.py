@@ -1,6 +1,164 @@
-from wireguard.models import WireGuardPeer
+from utils.crypto import CryptoService
+from wireguard.models import WireGuardPeer, active_peers_version, invalidate_active_peers
+from wireguard.services.peers import suppress_peer_signals
 
 def test_private_key_encryption(db):
     peer = WireGuardPeer(name="A", email="a@a.com", public_key="pub", allowed_ip="10.0.0.2")
     peer.set_private_key("priv")
     assert peer.get_private_key() == "priv"
+
+def test_private_key_decrypted_once_and_reset_on_set(db, monkeypatch):
+    peer = WireGuardPeer(name="A", email="a@a.com", public_key="pub", allowed_ip="10.0.0.2")
+    peer.set_private_key("priv")
+
+    calls = []
+    decrypt = CryptoService.decrypt
+    monkeypatch.setattr(CryptoService, "decrypt", lambda v: calls.append(v) or decrypt(v))
+    assert peer.get_private_key() == peer.get_private_key() == "priv"
+    assert len(calls) == 1
+
+    peer.set_private_key("other")
+    assert peer.get_private_key() == "other"
+
+def test_invalidate_active_peers_bumps_version_once(db, django_capture_on_commit_callbacks):
+    before = active_peers_version()
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        invalidate_active_peers()
+        invalidate_active_peers()
+    assert len(callbacks) == 1
+    assert active_peers_version() == before + 1
+
+def test_rolled_back_invalidation_does_not_block_the_next_one(db, django_capture_on_commit_callbacks):
+    from django.db import transaction
+
+    try:
+        with transaction.atomic():
+            invalidate_active_peers()
+            raise RuntimeError
+    except RuntimeError:
+        pass
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        invalidate_active_peers()
+    assert len(callbacks) == 1
+
+def test_queryset_delete_and_update_bump_active_peers_version(db, django_capture_on_commit_callbacks):
+    with suppress_peer_signals(), django_capture_on_commit_callbacks(execute=True):
+        WireGuardPeer.objects.create(name="A", email="a@a.com", public_key="pub", allowed_ip="10.0.0.2")
+
+    before = active_peers_version()
+    with django_capture_on_commit_callbacks(execute=True):
+        WireGuardPeer.objects.update(is_active=False)
+    assert active_peers_version() == before + 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        WireGuardPeer.objects.all().delete()
+    assert active_peers_version() == before + 2
+
+def test_server_cache_refreshed_only_after_commit(db, django_capture_on_commit_callbacks):
+    from django.core.cache import cache
+    from wireguard.constants import wg_server_config_key
+    from wireguard.models import WireGuardServer
+
+    cache.clear()
+    with django_capture_on_commit_callbacks() as callbacks:
+        server = WireGuardServer.objects.create(
+            name="s", endpoint="vpn.example.com", server_address="10.0.0.1/24",
+            public_key="pub", private_key_encrypted=CryptoService.encrypt("priv"),
+        )
+    assert cache.get(wg_server_config_key(server.id)) is None
+
+    refresh = [cb for cb in callbacks if getattr(cb, "__name__", "") == "_refresh_cache"]
+    assert len(refresh) == 1
+    refresh[0]()
+    assert cache.get(wg_server_config_key(server.id))["name"] == "s"
+
+def test_legacy_private_key_reencrypted_on_save(db):
+    from cryptography.fernet import Fernet
+    from django.conf import settings
+
+    with suppress_peer_signals():
+        peer = WireGuardPeer.objects.create(name="A", email="a@a.com", public_key="pub", allowed_ip="10.0.0.2")
+    legacy = Fernet(settings.ENCRYPTION_KEY).encrypt(b"priv").decode()
+    WireGuardPeer.objects.filter(id=peer.id).update(private_key_encrypted=legacy)
+
+    peer.refresh_from_db()
+    with suppress_peer_signals():
+        peer.save(update_fields=["email"])
+
+    peer.refresh_from_db()
+    assert not CryptoService.is_legacy(peer.private_key_encrypted)
+    assert peer.get_private_key() == "priv"
+
+def test_get_default_served_from_cache(db, django_assert_num_queries):
+    from django.core.cache import cache
+    from wireguard.models import WireGuardServer
+
+    cache.clear()
+    server = WireGuardServer.objects.create(
+        name="s", endpoint="vpn.example.com", server_address="10.0.0.1/24",
+        public_key="pub", private_key_encrypted=CryptoService.encrypt("priv"),
+    )
+    assert WireGuardServer.get_default().id == server.id
+
+    with django_assert_num_queries(0):
+        for _ in range(3):
+            assert WireGuardServer.get_default().name == "s"
+
+def test_duplicate_ip_rejected_without_server(db):
+    import pytest
+    from django.core.cache import cache
+    from django.db import IntegrityError, transaction
+
+    cache.clear()
+    with suppress_peer_signals():
+        WireGuardPeer.objects.create(name="A", email="a@a.com", allowed_ip="10.0.0.2")
+        with pytest.raises(IntegrityError), transaction.atomic():
+            WireGuardPeer.objects.create(name="B", email="b@b.com", allowed_ip="10.0.0.2")
+
+def test_unassigned_peer_pinned_to_default_and_validated(db):
+    import pytest
+    from django.core.cache import cache
+    from django.core.exceptions import ValidationError
+    from wireguard.models import WireGuardServer
+
+    cache.clear()
+    server = WireGuardServer.objects.create(
+        name="s", endpoint="vpn.example.com", server_address="10.0.0.1/24",
+        public_key="pub", private_key_encrypted=CryptoService.encrypt("priv"),
+    )
+    with suppress_peer_signals():
+        peer = WireGuardPeer.objects.create(name="A", email="a@a.com", allowed_ip="10.0.0.2")
+    assert peer.server_id == server.id
+
+    with pytest.raises(ValidationError) as exc:
+        WireGuardPeer(name="B", email="b@b.com", allowed_ip="10.0.0.2").clean()
+    assert "allowed_ip" in exc.value.message_dict
+
+def test_server_ids_rebuilt_from_db_when_evicted(db):
+    from django.core.cache import cache
+    from wireguard.constants import WG_SERVER_IDS_CACHE_KEY
+    from wireguard.models import WireGuardServer
+
+    cache.clear()
+    server = WireGuardServer.objects.create(
+        name="s", endpoint="vpn.example.com", server_address="10.0.0.1/24",
+        public_key="pub", private_key_encrypted=CryptoService.encrypt("priv"),
+    )
+    cache.delete(WG_SERVER_IDS_CACHE_KEY)
+    assert WireGuardServer.cached_ids() == {server.id}
+    assert cache.get(WG_SERVER_IDS_CACHE_KEY) == {server.id}
+
+def test_private_key_memo_follows_ciphertext(db):
+    with suppress_peer_signals():
+        peer = WireGuardPeer.objects.create(name="A", email="a@a.com", public_key="pub", allowed_ip="10.0.0.2")
+        peer.set_private_key("priv")
+        peer.save()
+    assert peer.get_private_key() == "priv"
+
+    WireGuardPeer.objects.filter(id=peer.id).update(private_key_encrypted=CryptoService.encrypt("other"))
+    peer.refresh_from_db()
+    assert peer.get_private_key() == "other"
+
+    peer.private_key_encrypted = CryptoService.encrypt("third")
+    assert peer.get_private_key() == "third"
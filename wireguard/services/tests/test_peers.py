@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from wireguard.models import WireGuardPeer
+from wireguard.services.peers import create_peers, peer_signals_suppressed, suppress_peer_signals
+
+def test_create_peers_queues_one_onboarding_task(db, django_capture_on_commit_callbacks):
+    cache.clear()
+    with mock.patch("wireguard.tasks.bulk_onboard_peers.delay") as delay:
+        with django_capture_on_commit_callbacks(execute=True):
+            peers = create_peers([
+                {"name": "a", "email": "a@a.com", "allowed_ip": "10.0.0.2"},
+                {"name": "b", "email": "b@b.com", "allowed_ip": "10.0.0.3", "private_key": "priv"},
+            ])
+
+    assert WireGuardPeer.objects.count() == 2
+    delay.assert_called_once_with([p.id for p in peers])
+    assert WireGuardPeer.objects.get(name="a").private_key_encrypted == ""
+    assert WireGuardPeer.objects.get(name="b").get_private_key() == "priv"
+
+def test_suppress_peer_signals_is_scoped():
+    assert not peer_signals_suppressed()
+    with suppress_peer_signals():
+        assert peer_signals_suppressed()
+    assert not peer_signals_suppressed()
+
+def test_peer_sync_skipped_only_after_live_state_was_applied(db):
+    from wireguard.models import live_state_digest, remember_live_state
+    from wireguard.signals import live_state_changed
+
+    cache.clear()
+    peer = WireGuardPeer(id=1, public_key="pub", allowed_ip="10.0.0.2")
+    # Nothing recorded until a sync succeeds
+    assert live_state_changed(peer)
+    assert live_state_changed(peer)
+
+    remember_live_state({1: live_state_digest("pub", "10.0.0.2", True, None)})
+    assert not live_state_changed(peer)
+    assert not live_state_changed(peer, update_fields={"email"})
+
+    peer.allowed_ip = "10.0.0.3"
+    assert live_state_changed(peer, update_fields={"allowed_ip"})
+
+def test_queryset_update_forgets_live_state(db):
+    from wireguard.models import live_state_digest, remember_live_state
+    from wireguard.signals import live_state_changed
+
+    cache.clear()
+    with suppress_peer_signals():
+        peer = WireGuardPeer.objects.create(name="a", email="a@a.com", public_key="pub", allowed_ip="10.0.0.2")
+    remember_live_state({peer.id: live_state_digest("pub", "10.0.0.2", True, None)})
+
+    WireGuardPeer.objects.filter(id=peer.id).update(is_active=False)
+    WireGuardPeer.objects.filter(id=peer.id).update(is_active=True)
+    peer.refresh_from_db()
+    assert live_state_changed(peer)
+
+def test_committed_save_survives_broker_outage(transactional_db):
+    from django.db import transaction
+    from wireguard.tasks import onboard_peer
+
+    cache.clear()
+    with mock.patch.object(onboard_peer, "apply_async", side_effect=ConnectionError):
+        with transaction.atomic():
+            WireGuardPeer.objects.create(name="a", email="a@a.com", allowed_ip="10.0.0.2")
+
+    assert WireGuardPeer.objects.filter(name="a").exists()
@@ -0,0 +1,48 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from wireguard.tasks import queue_once, sync_wg_config
+
+def test_queue_once_coalesces_repeat_calls():
+    cache.clear()
+    with mock.patch.object(sync_wg_config, "apply_async") as apply_async:
+        assert queue_once(sync_wg_config, 1)
+        assert not queue_once(sync_wg_config, 1)
+        assert queue_once(sync_wg_config, 2)
+
+    assert apply_async.call_args_list == [
+        mock.call((1,), countdown=2),
+        mock.call((2,), countdown=2),
+    ]
+
+def test_sync_wg_config_retries_only_transient_errors():
+    for error, calls in ((OSError("busy"), 3), (PermissionError("sudo"), 1), (ValueError("bad"), 1)):
+        with mock.patch("wireguard.tasks.get_server_cached", side_effect=error) as get:
+            result = sync_wg_config.apply((1,))
+        assert isinstance(result.result, type(error))
+        assert get.call_count == calls
+
+def test_onboard_peer_does_not_queue_itself_again(db, django_capture_on_commit_callbacks):
+    from utils.crypto import CryptoService
+    from wireguard.models import WireGuardPeer, WireGuardServer
+    from wireguard.tasks import inject_peer_live, onboard_peer, sync_peers_bulk
+
+    cache.clear()
+    WireGuardServer.objects.create(
+        name="s", endpoint="vpn.example.com", server_address="10.0.0.1/24",
+        public_key="pub", private_key_encrypted=CryptoService.encrypt("priv"),
+    )
+    with mock.patch.object(onboard_peer, "apply_async") as queued:
+        peer = WireGuardPeer.objects.create(name="a", email="a@a.com", allowed_ip="10.0.0.2")
+        queued.reset_mock()
+
+        with mock.patch("wireguard.services.onboarding.generate_qr", return_value=None), \
+                mock.patch.object(inject_peer_live, "delay") as inject, \
+                mock.patch.object(sync_wg_config, "apply_async"), \
+                mock.patch.object(sync_peers_bulk, "apply_async"), \
+                django_capture_on_commit_callbacks(execute=True):
+            onboard_peer.apply((peer.id,))
+
+    queued.assert_not_called()
+    inject.assert_called_once_with(peer.id)
@@ -0,0 +1,33 @@
+import base64
+
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+from wireguard.models import WireGuardPeer
+from wireguard.services.wireguard import WireGuardService
+
+def test_generate_keys_returns_clamped_matching_pair():
+    private_key, public_key = WireGuardService.generate_keys()
+    raw = base64.b64decode(private_key)
+    assert len(raw) == 32
+    assert raw[0] & 7 == 0 and raw[31] & 128 == 0 and raw[31] & 64
+
+    expected = X25519PrivateKey.from_private_bytes(raw).public_key().public_bytes(
+        Encoding.Raw, PublicFormat.Raw
+    )
+    assert base64.b64decode(public_key) == expected
+
+def test_generate_keys_wg_backend(settings, monkeypatch):
+    settings.WIREGUARD_KEYGEN_BACKEND = "wg"
+    monkeypatch.setattr(WireGuardService, "_generate_keys_wg", staticmethod(lambda timeout=5: ("priv", "pub")))
+    assert WireGuardService.generate_keys() == ("priv", "pub")
+
+def test_netlink_peer_spec():
+    peer = WireGuardPeer(public_key="pub", allowed_ip="10.0.0.2")
+    assert WireGuardService.netlink_peer(peer, 25) == {
+        "public_key": "pub",
+        "allowed_ips": ["10.0.0.2/32"],
+        "replace_allowed_ips": True,
+        "persistent_keepalive": 25,
+    }
+    assert "persistent_keepalive" not in WireGuardService.netlink_peer(peer)
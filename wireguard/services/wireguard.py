@@ -1,14 +1,27 @@
+import asyncio
+import base64
+import ipaddress
+import logging
 import os
 import subprocess
+from functools import lru_cache
+from cryptography.exceptions import UnsupportedAlgorithm
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 from django.conf import settings
 from django.core.cache import cache
 
-from wireguard.models import WireGuardPeer
-from wireguard.constants import WG_ACTIVE_PEERS_CACHE_KEY
+from utils import wg_netlink
+from utils.crypto import CryptoService
+from utils.json_cache import get_or_build_json
+from wireguard.models import WireGuardPeer, WireGuardServer, active_peers_version
+from wireguard.constants import wg_active_peers_key
 from .qr import generate_qr
 
 
 
+logger = logging.getLogger(__name__)
+
 WG_BIN = "/usr/bin/wg"
 
 
@@ -16,38 +29,55 @@ WG_BIN = "/usr/bin/wg"
 # ACTIVE PEERS CACHE
 # ============================================================
 
+# Peer writes move readers to a new versioned key; superseded entries
+# simply expire.
+ACTIVE_PEERS_TTL = 24 * 60 * 60
+
+@lru_cache(maxsize=4096)
+def _decrypt_private_key(peer_id: int, updated_at_epoch: float, ciphertext: str) -> str:
+    """
+    Process-local memo of decrypted peer keys. A peer save bumps
+    updated_at, so stale entries are never hit, just aged out.
+    """
+    return CryptoService.decrypt(ciphertext) if ciphertext else ""
+
+
 def get_active_peers():
     """
     Cached list of active WireGuard peers.
     Used by config generation and sync logic.
     """
-    peers = cache.get(WG_ACTIVE_PEERS_CACHE_KEY)
-    if peers:
-        return peers
-
-    qs = (
-        WireGuardPeer.objects
-        .filter(is_active=True)
-        .select_related("server")
-    )
-
-    peers = []
-    for peer in qs:
-        server = peer.get_server()
-        peers.append({
-            "id": peer.id,
-            "name": peer.name,
-            "email": peer.email,
-            "public_key": peer.public_key,
-            "private_key": peer.get_private_key(),
-            "allowed_ip": peer.allowed_ip,
-            "server_id": peer.server_id,
-            "server_endpoint": peer.get_endpoint(),
-            "platform": peer.platform,
-        })
-
-    cache.set(WG_ACTIVE_PEERS_CACHE_KEY, peers, timeout=None)
-    return peers
+    key = wg_active_peers_key(active_peers_version())
+    return get_or_build_json(key, _build_active_peers, timeout=ACTIVE_PEERS_TTL)
+
+
+def _build_active_peers() -> list[dict]:
+    rows = list(WireGuardPeer.objects.filter(is_active=True).for_config_render())
+
+    # Unassigned peers fall back to the default server, resolved once
+    default_endpoint = ""
+    if any(row["server_id"] is None for row in rows):
+        default = WireGuardServer.get_default()
+        default_endpoint = default.endpoint if default else ""
+
+    return [
+        {
+            "id": row["id"],
+            "name": row["name"],
+            "email": row["email"],
+            "public_key": row["public_key"],
+            "private_key": _decrypt_private_key(
+                row["id"], row["updated_at"].timestamp(), row["private_key_encrypted"]
+            ),
+            "allowed_ip": row["allowed_ip"],
+            "server_id": row["server_id"],
+            "server_endpoint": row["server_endpoint"] or (
+                row["server__endpoint"] if row["server_id"] is not None else default_endpoint
+            ),
+            "platform": row["platform"],
+        }
+        for row in rows
+    ]
 
 
 # ============================================================
@@ -68,39 +98,67 @@ class WireGuardService:
     @staticmethod
     def generate_keys(timeout: int = 5) -> tuple[str, str]:
         """
-        Generate WireGuard private & public keys using system wg binary.
+        Generate WireGuard private & public keys.
+
+        Keys are derived in-process with X25519. The system wg binary is
+        used when WIREGUARD_KEYGEN_BACKEND is "wg" or the OpenSSL build
+        lacks X25519.
 
         Returns:
             (private_key, public_key)
         """
+        if getattr(settings, "WIREGUARD_KEYGEN_BACKEND", "native") == "wg":
+            return WireGuardService._generate_keys_wg(timeout)
+
+        try:
+            return WireGuardService._generate_keys_native()
+        except UnsupportedAlgorithm:
+            return WireGuardService._generate_keys_wg(timeout)
+
+    @staticmethod
+    def _generate_keys_native() -> tuple[str, str]:
+        """
+        Equivalent of `wg genkey | wg pubkey` without forking.
+        """
+        # Clamp the scalar the same way `wg genkey` does
+        raw = bytearray(os.urandom(32))
+        raw[0] &= 248
+        raw[31] = (raw[31] & 127) | 64
+
+        public_raw = X25519PrivateKey.from_private_bytes(bytes(raw)).public_key().public_bytes(
+            Encoding.Raw, PublicFormat.Raw
+        )
+        return base64.b64encode(raw).decode(), base64.b64encode(public_raw).decode()
+
+    @staticmethod
+    def _generate_keys_wg(timeout: int = 5) -> tuple[str, str]:
+        """
+        Generate WireGuard private & public keys using system wg binary.
+        """
         if os.name == "nt":
             raise RuntimeError("WireGuard is not supported on Windows")
 
+        # One shell runs `wg genkey | wg pubkey` and prints both keys, so
+        # only one process is spawned from Python
+        script = (
+            f'set -e; k=$({WG_BIN} genkey); '
+            f'p=$(printf "%s" "$k" | {WG_BIN} pubkey); '
+            f'printf "%s\\n%s\\n" "$k" "$p"'
+        )
+
         try:
-            # Generate private key
-            private_key_proc = subprocess.run(
-                [WG_BIN, "genkey"],
+            proc = subprocess.run(
+                ["/bin/sh", "-c", script],
                 capture_output=True,
                 text=True,
                 timeout=timeout,
                 check=True,
             )
 
-            private_key = private_key_proc.stdout.strip()
+            private_key, _, public_key = proc.stdout.partition("\n")
+            private_key, public_key = private_key.strip(), public_key.strip()
             if not private_key:
                 raise RuntimeError("Empty private key returned")
-
-            # Generate public key
-            public_key_proc = subprocess.run(
-                [WG_BIN, "pubkey"],
-                input=private_key,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                check=True,
-            )
-
-            public_key = public_key_proc.stdout.strip()
             if not public_key:
                 raise RuntimeError("Empty public key returned")
 
@@ -116,6 +174,12 @@ class WireGuardService:
             )
 
         except subprocess.CalledProcessError as e:
+            if e.returncode == 127:
+                # sh: command not found
+                raise RuntimeError(
+                    "WireGuard binary not found at /usr/bin/wg. "
+                    "Install with: apt install wireguard-tools"
+                )
             stderr = e.stderr.strip() if e.stderr else "unknown error"
             raise RuntimeError(f"WireGuard key generation failed: {stderr}")
 
@@ -135,6 +199,79 @@ class WireGuardService:
 
         subprocess.run(cmd, check=True)
 
+    @staticmethod
+    async def _run_async(cmd: list[str]):
+        """
+        Async counterpart of _run(); raises CalledProcessError on failure.
+        """
+        if os.name == "nt":
+            return
+
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(
+                proc.returncode, cmd, stderr=stderr.decode(errors="replace")
+            )
+
+    @classmethod
+    async def inject_many(cls, cmds: list[list[str]]) -> list:
+        """
+        Run several wg commands concurrently. Returns one entry per command,
+        in order: None on success, the raised exception otherwise.
+        """
+        return await asyncio.gather(
+            *(cls._run_async(cmd) for cmd in cmds),
+            return_exceptions=True,
+        )
+
+    @classmethod
+    def inject_many_sync(cls, cmds: list[list[str]]) -> list:
+        """
+        inject_many() for synchronous callers such as Celery tasks.
+        """
+        if not cmds:
+            return []
+        return asyncio.run(cls.inject_many(cmds))
+
+    # --------------------------------------------------------
+
+    @staticmethod
+    def set_peers_netlink(interface: str, peers: list[dict]) -> bool:
+        """
+        Apply peer changes over netlink (pyroute2) on one socket instead of
+        forking wg. Returns False when netlink isn't usable here (package
+        missing, no CAP_NET_ADMIN, ...) so callers fall back to wg.
+        """
+        if os.name == "nt" or not wg_netlink.is_available():
+            return False
+
+        try:
+            wg_netlink.set_peers(interface, peers)
+        except Exception as exc:
+            logger.warning("Netlink peer update on %s failed, falling back to wg: %s", interface, exc)
+            return False
+        return True
+
+    @staticmethod
+    def netlink_peer(peer: WireGuardPeer, keepalive: int | None = None) -> dict:
+        """
+        pyroute2 peer spec equivalent to `wg set <if> peer <key> allowed-ips <ip>`.
+        Like wg, it replaces the peer's allowed IPs instead of appending.
+        """
+        spec = {
+            "public_key": peer.public_key,
+            "allowed_ips": [str(ipaddress.ip_network(peer.allowed_ip))],
+            "replace_allowed_ips": True,
+        }
+        if keepalive:
+            spec["persistent_keepalive"] = keepalive
+        return spec
+
     # --------------------------------------------------------
 
     @classmethod
@@ -142,17 +279,23 @@ class WireGuardService:
         """
         Inject peer into a live WireGuard interface.
         """
-        cls._run([
-            WG_BIN,
-            "set",
-            settings.WIREGUARD_INTERFACE,
-            "peer",
-            peer.public_key,
-            "allowed-ips",
-            peer.allowed_ip,
-        ])
-
-        cache.delete(WG_ACTIVE_PEERS_CACHE_KEY)
+        server = peer.get_server()
+        keepalive = server.persistent_keepalive if server else None
+        spec = cls.netlink_peer(peer, keepalive)
+
+        if not cls.set_peers_netlink(settings.WIREGUARD_INTERFACE, [spec]):
+            cmd = [
+                WG_BIN,
+                "set",
+                settings.WIREGUARD_INTERFACE,
+                "peer",
+                peer.public_key,
+                "allowed-ips",
+                peer.allowed_ip,
+            ]
+            if keepalive:
+                cmd += ["persistent-keepalive", str(keepalive)]
+            cls._run(cmd)
 
     # --------------------------------------------------------
 
@@ -161,13 +304,14 @@ class WireGuardService:
         """
         Remove peer from a live WireGuard interface.
         """
-        cls._run([
-            WG_BIN,
-            "set",
-            settings.WIREGUARD_INTERFACE,
-            "peer",
-            peer.public_key,
-            "remove",
-        ])
-
-        cache.delete(WG_ACTIVE_PEERS_CACHE_KEY)
+        spec = {"public_key": peer.public_key, "remove": True}
+
+        if not cls.set_peers_netlink(settings.WIREGUARD_INTERFACE, [spec]):
+            cls._run([
+                WG_BIN,
+                "set",
+                settings.WIREGUARD_INTERFACE,
+                "peer",
+                peer.public_key,
+                "remove",
+            ])
@@ -1,10 +1,26 @@
 # wireguard/signals.py
 import logging
+
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.core.cache import cache
-from .models import WireGuardPeer, WireGuardServer, SMTPSettings
-from .constants import SMTP_SETTINGS_CACHE_KEY, WG_ACTIVE_PEERS_CACHE_KEY, WG_SERVER_CACHE_KEY
+from .models import (
+    LIVE_PEER_FIELDS,
+    SMTPSettings,
+    WireGuardPeer,
+    WireGuardServer,
+    forget_live_state,
+    invalidate_active_peers,
+    live_state_digest,
+)
+from .constants import (
+    SMTP_SETTINGS_CACHE_KEY,
+    WG_SERVER_CACHE_KEY,
+    wg_peer_state_key,
+    wg_server_config_key,
+    wg_server_row_key,
+)
+from .services.peers import peer_signals_suppressed
 
 logger = logging.getLogger(__name__)
 
@@ -12,49 +28,107 @@ logger = logging.getLogger(__name__)
 # PEER SIGNALS
 # ============================================================
 
-@receiver(post_save, sender=WireGuardPeer)
+@receiver(post_save, sender=WireGuardPeer, dispatch_uid="wireguard.trigger_onboarding")
 def trigger_onboarding(sender, instance: WireGuardPeer, created, **kwargs):
     """
     Trigger onboarding asynchronously for new peers or peers missing keys.
     """
+    if peer_signals_suppressed():
+        return
+
     needs_onboarding = created or (not instance.public_key or instance.public_key.strip() in ('', '-'))
     if needs_onboarding:
-        from .tasks import onboard_peer
+        from .tasks import onboard_peer, queue_once_on_commit
         try:
-            onboard_peer.delay(instance.id)
-            logger.info("Queued onboarding task for peer %s", instance.name)
+            # Queued after COMMIT so the worker always finds the row;
+            # queue_once folds repeat saves in the same window. onboard_peer
+            # suppresses these receivers for its own saves.
+            queue_once_on_commit(onboard_peer, instance.id)
+            logger.info("Scheduled onboarding task for peer %s", instance.name)
         except Exception as e:
             logger.exception("Failed to queue onboarding for peer %s: %s", instance.name, e)
 
 
-@receiver(post_save, sender=WireGuardPeer)
-def trigger_peer_injection(sender, instance: WireGuardPeer, created, **kwargs):
+# Window in which peer changes on one server are folded into a single sync
+PEER_SYNC_DEBOUNCE_SECONDS = 1
+
+
+def schedule_peer_sync(peer: WireGuardPeer):
+    """
+    Queue one sync_peers_bulk run per server per debounce window, once the
+    current transaction commits.
+    """
+    from .tasks import queue_once_on_commit, sync_peers_bulk
+
+    server = peer.get_server()
+    if server is None:
+        return False
+
+    queue_once_on_commit(sync_peers_bulk, server.id, delay=PEER_SYNC_DEBOUNCE_SECONDS)
+    return True
+
+
+def live_state_changed(peer: WireGuardPeer, update_fields=None) -> bool:
     """
-    Inject peer into live WireGuard interface on updates only.
+    Whether this save touched what the interface sees. Saves limited to
+    other fields are answered from update_fields; otherwise a digest of
+    the live fields is compared with the one recorded by the last
+    successful sync of this peer.
     """
+    if update_fields is not None and not LIVE_PEER_FIELDS & set(update_fields):
+        return False
+
+    digest = live_state_digest(peer.public_key, peer.allowed_ip, peer.is_active, peer.server_id)
+    return cache.get(wg_peer_state_key(peer.id)) != digest
+
+
+@receiver(post_save, sender=WireGuardPeer, dispatch_uid="wireguard.trigger_peer_injection")
+def trigger_peer_injection(sender, instance: WireGuardPeer, created, update_fields=None, **kwargs):
+    """
+    Push peer updates to the live interface (batched per server).
+    """
+    if peer_signals_suppressed():
+        return
+
+    try:
+        changed = live_state_changed(instance, update_fields)
+    except Exception as e:
+        logger.warning("Could not compare live state of peer %s: %s", instance.name, e)
+        changed = True
+
     if created:
         # Skip injection for new peers; onboarding will handle it
         logger.info("New peer %s created - injection will occur after onboarding", instance.name)
         return
 
-    from .tasks import inject_peer_live
+    if not changed:
+        logger.debug("Peer %s saved without live changes; no sync queued", instance.name)
+        return
+
     try:
-        inject_peer_live.delay(instance.id)
-        logger.info("Queued peer injection task for %s", instance.name)
+        if schedule_peer_sync(instance):
+            logger.info("Scheduled peer sync for %s", instance.name)
     except Exception as e:
-        logger.exception("Failed to queue peer injection for %s: %s", instance.name, e)
+        logger.exception("Failed to queue peer sync for %s: %s", instance.name, e)
 
 
-@receiver(post_delete, sender=WireGuardPeer)
+@receiver(post_delete, sender=WireGuardPeer, dispatch_uid="wireguard.trigger_peer_removal")
 def trigger_peer_removal(sender, instance: WireGuardPeer, **kwargs):
     """
-    When a peer is deleted, remove it from the live interface asynchronously.
+    When a peer is deleted, resync its server so the peer is dropped live.
     """
-    from .tasks import inject_peer_live
+    # Admin bulk delete goes through QuerySet.delete(), which skips
+    # WireGuardPeer.delete(); without this the sync would re-add the peer
+    # from the cached list.
+    invalidate_active_peers()
+
+    if peer_signals_suppressed():
+        return
+
     try:
-        instance.is_active = False  # Mark as inactive for removal
-        inject_peer_live.delay(instance.id)
-        logger.info("Queued peer removal task for %s", instance.name)
+        forget_live_state([instance.id])
+        if schedule_peer_sync(instance):
+            logger.info("Scheduled peer sync for removal of %s", instance.name)
     except Exception as e:
         logger.exception("Failed to queue peer removal for %s: %s", instance.name, e)
 
@@ -63,40 +137,44 @@ def trigger_peer_removal(sender, instance: WireGuardPeer, **kwargs):
 # SERVER SIGNALS
 # ============================================================
 
-@receiver(post_save, sender=WireGuardServer)
+@receiver(post_save, sender=WireGuardServer, dispatch_uid="wireguard.invalidate_server_cache")
 def invalidate_server_cache(sender, instance: WireGuardServer, **kwargs):
     """
     Invalidate cache when server configuration changes.
     """
     try:
         cache.delete(WG_SERVER_CACHE_KEY)
-        cache.delete(WG_ACTIVE_PEERS_CACHE_KEY)
+        invalidate_active_peers()
         logger.info("Invalidated server and active peers cache for server %s", instance.name)
     except Exception as e:
         logger.warning("Could not invalidate server cache: %s", e)
 
 
-@receiver(post_save, sender=WireGuardServer)
+@receiver(post_save, sender=WireGuardServer, dispatch_uid="wireguard.sync_wg_config_on_save")
 def sync_wg_config_on_save(sender, instance: WireGuardServer, **kwargs):
     """
     Regenerate wg0.conf asynchronously when server config changes.
     """
-    from .tasks import sync_wg_config
+    from .tasks import queue_once_on_commit, sync_wg_config
     try:
-        sync_wg_config.delay(instance.id)
-        logger.info("Queued WireGuard config sync for server %s", instance.name)
+        queue_once_on_commit(sync_wg_config, instance.id)
+        logger.info("Scheduled WireGuard config sync for server %s", instance.name)
     except Exception as e:
         logger.exception("Failed to queue config sync for server %s: %s", instance.name, e)
 
 
-@receiver(post_delete, sender=WireGuardServer)
+@receiver(post_delete, sender=WireGuardServer, dispatch_uid="wireguard.invalidate_server_cache_on_delete")
 def invalidate_server_cache_on_delete(sender, instance: WireGuardServer, **kwargs):
     """
     Invalidate cache when server is deleted.
     """
     try:
-        cache.delete(WG_SERVER_CACHE_KEY)
-        cache.delete(WG_ACTIVE_PEERS_CACHE_KEY)
+        cache.delete_many([
+            WG_SERVER_CACHE_KEY,
+            wg_server_row_key(instance.id),
+            wg_server_config_key(instance.id),
+        ])
+        invalidate_active_peers()
         logger.info("Invalidated server cache for deleted server %s", instance.name)
     except Exception as e:
         logger.warning("Could not invalidate server cache on delete: %s", e)
@@ -106,8 +184,8 @@ def invalidate_server_cache_on_delete(sender, instance: WireGuardServer, **kwarg
 # SMTP SETTINGS CACHE
 # ============================================================
 
-@receiver(post_save, sender=SMTPSettings)
-@receiver(post_delete, sender=SMTPSettings)
+@receiver(post_save, sender=SMTPSettings, dispatch_uid="wireguard.invalidate_smtp_cache.post_save")
+@receiver(post_delete, sender=SMTPSettings, dispatch_uid="wireguard.invalidate_smtp_cache.post_delete")
 def invalidate_smtp_cache(sender, instance, **kwargs):
     """
     Clear cached SMTP settings whenever they are changed.
@@ -1,12 +1,26 @@
+import os
 import subprocess
-import sys
+import tempfile
 
 from celery import shared_task
+from celery.utils.log import get_task_logger
 from django.conf import settings
-
-from .models import WireGuardPeer, WireGuardServer
+from django.core.cache import cache
+from django.db import OperationalError, transaction
+
+from .models import (
+    WireGuardPeer,
+    WireGuardServer,
+    get_server_cached,
+    live_state_digest,
+    remember_live_state,
+)
 from .services.onboarding import onboard, generate_server_config
+from .services.peers import suppress_peer_signals
+from .services.wireguard import WireGuardService, get_active_peers
+
 
+logger = get_task_logger(__name__)
 
 # Absolute binaries (VERY IMPORTANT for Celery)
 SUDO = "/usr/bin/sudo"
@@ -14,22 +28,64 @@ WG = "/usr/bin/wg"
 TEE = "/usr/bin/tee"
 CHMOD = "/usr/bin/chmod"
 
+# Retry only failures that can clear up on their own (a slow sudo/wg, a
+# dropped DB or SMTP connection) with exponential backoff capped at 30s.
+# Missing paths, sudo denials and bad data fail at once.
+RETRY_POLICY = {
+    "autoretry_for": (OSError, subprocess.TimeoutExpired, OperationalError),
+    "dont_autoretry_for": (PermissionError, FileNotFoundError, IsADirectoryError),
+    "retry_backoff": True,
+    "retry_backoff_max": 30,
+}
+
+
+def queue_once(task, key, delay: int = 2) -> bool:
+    """
+    Enqueue task(key) unless the same call was already queued within the
+    last `delay` seconds. The queued run starts when the window closes, so
+    it sees every change made during it. Returns True if a task was queued.
+    """
+    if not cache.add(f"dedup:{task.name}:{key}", 1, timeout=delay):
+        return False
+
+    task.apply_async((key,), countdown=delay)
+    return True
+
+
+def queue_once_on_commit(task, key, delay: int = 2) -> None:
+    """
+    queue_once() after the current transaction commits. The caller's save
+    has already committed by then, so a broker outage is logged instead of
+    escaping from the atomic block (and turning a saved form into a 500).
+    """
+    def enqueue():
+        try:
+            queue_once(task, key, delay=delay)
+        except Exception as e:
+            logger.error("Failed to queue %s for %s: %s", task.name, key, e)
+
+    transaction.on_commit(enqueue)
+
 
 # ============================================================
 # Peer Onboarding Task
 # ============================================================
 
-@shared_task(bind=True, max_retries=3)
+@shared_task(bind=True, max_retries=3, **RETRY_POLICY)
 def onboard_peer(self, peer_id: int):
     try:
-        onboard(peer_id)
-        print(f"[ONBOARD] Completed for peer {peer_id}", file=sys.stderr)
+        # onboard() saves the peer before its keys exist; the receivers
+        # would queue another onboard_peer (and a second email). The
+        # follow-up work is queued below instead.
+        with suppress_peer_signals():
+            peer = onboard(peer_id)
+        logger.info("[ONBOARD] Completed for peer %s", peer_id)
 
-        peer = WireGuardPeer.objects.get(id=peer_id)
-        server = peer.server or peer.get_server()
+        # onboard() assigns the default server when the peer had none
+        server = peer.server
 
         if server:
-            sync_wg_config.delay(server.id)
+            queue_once(sync_wg_config, server.id)
             inject_peer_live.delay(peer.id)
 
         return {"status": "success", "peer_id": peer_id}
@@ -38,120 +94,331 @@ def onboard_peer(self, peer_id: int):
         return {"status": "error", "message": "Peer not found"}
 
     except Exception as e:
-        print(f"[ONBOARD] ERROR: {e}", file=sys.stderr)
-        raise self.retry(exc=e, countdown=10)
+        logger.error("[ONBOARD] ERROR: %s", e)
+        raise
+
+
+@shared_task(bind=True)
+def bulk_onboard_peers(self, peer_ids: list[int]):
+    """
+    Onboard a batch of peers, then sync each affected server once instead
+    of once per peer.
+    """
+    server_ids = set()
+    failed = []
+
+    # onboard() saves each peer; the per-peer receivers would queue the
+    # work done below a second time
+    with suppress_peer_signals():
+        for peer_id in peer_ids:
+            try:
+                peer = onboard(peer_id)
+            except Exception as e:
+                logger.error("[ONBOARD] ERROR for peer %s: %s", peer_id, e)
+                failed.append(peer_id)
+                continue
+
+            if peer.server_id:
+                server_ids.add(peer.server_id)
+
+    for server_id in server_ids:
+        queue_once(sync_wg_config, server_id)
+        queue_once(sync_peers_bulk, server_id)
+
+    logger.info("[ONBOARD] Bulk completed: %d/%d", len(peer_ids) - len(failed), len(peer_ids))
+    return {
+        "status": "partial" if failed else "success",
+        "onboarded": len(peer_ids) - len(failed),
+        "failed": failed,
+    }
 
 
 # ============================================================
 # Server Configuration Sync Task
 # ============================================================
 
-@shared_task(bind=True, max_retries=2)
+def _same_content(path: str, content: bytes) -> bool:
+    try:
+        with open(path, "rb") as fh:
+            current = fh.read()
+    except OSError:
+        # Missing, or unreadable without sudo: write it
+        return False
+    return current == content
+
+
+def _write_config(config_path: str, content: str) -> bool:
+    """
+    Write a root-readable WireGuard config with mode 0600. Returns False
+    when the file already holds exactly this content.
+
+    Written directly when the app can write the config directory (the
+    wireguard group, see scripts/install.sh) via a temp file, fsync and
+    os.replace, so a crash never leaves a partial config. sudo tee is
+    only the fallback.
+    """
+    data = content.encode()
+    if _same_content(config_path, data):
+        return False
+
+    config_dir = os.path.dirname(config_path)
+    if os.access(config_dir, os.W_OK):
+        # mkstemp creates the file with mode 0600
+        fd, tmp_path = tempfile.mkstemp(dir=config_dir, prefix=".wg-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, config_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return True
+
+    proc = subprocess.run(
+        [SUDO, "-n", TEE, config_path],
+        input=content,
+        text=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+
+    if proc.returncode != 0:
+        raise PermissionError(proc.stderr.strip())
+
+    # Secure permissions
+    subprocess.run(
+        [SUDO, "-n", CHMOD, "600", config_path],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    return True
+
+
+@shared_task(bind=True, max_retries=2, **RETRY_POLICY)
 def sync_wg_config(self, server_id: int):
     try:
-        server = WireGuardServer.objects.get(id=server_id)
+        server = get_server_cached(server_id)
         private_key = server.get_private_key()
         config_content = generate_server_config(server, private_key)
 
         config_path = f"/etc/wireguard/{server.interface}.conf"
 
-        # Write config using sudo + tee (no temp files)
-        proc = subprocess.run(
-            [SUDO, "-n", TEE, config_path],
-            input=config_content,
-            text=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
+        if not _write_config(config_path, config_content):
+            return {"status": "unchanged", "server": server.interface}
 
-        if proc.returncode != 0:
-            raise PermissionError(proc.stderr.strip())
-
-        # Secure permissions
-        subprocess.run(
-            [SUDO, "-n", CHMOD, "600", config_path],
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.PIPE,
-        )
-
-        print(f"[WG_SYNC] Config written: {config_path}", file=sys.stderr)
+        logger.info("[WG_SYNC] Config written: %s", config_path)
         return {"status": "success", "server": server.interface}
 
     except WireGuardServer.DoesNotExist:
         return {"status": "error", "message": "Server not found"}
 
     except PermissionError as e:
-        print(f"[WG_SYNC] PERMISSION ERROR: {e}", file=sys.stderr)
-        # Do NOT retry endlessly on sudo failures
+        logger.error("[WG_SYNC] PERMISSION ERROR: %s", e)
+        # Do NOT retry on sudo failures (see RETRY_POLICY)
         raise
 
     except Exception as e:
-        print(f"[WG_SYNC] ERROR: {e}", file=sys.stderr)
-        raise self.retry(exc=e, countdown=10)
+        logger.error("[WG_SYNC] ERROR: %s", e)
+        raise
 
 
 # ============================================================
 # Live Peer Injection Task
 # ============================================================
 
-@shared_task(bind=True, max_retries=2)
-def inject_peer_live(self, peer_id: int):
+def _peer_command(peer: WireGuardPeer):
+    """
+    Build the wg(8) command that applies a peer's state to its server.
+    Returns (cmd, action), or (None, reason) when the peer is skipped.
+    """
+    server = peer._effective_server
+
+    if not server or not server.is_active:
+        return None, "No active server"
+
+    if not peer.public_key or peer.public_key.strip() in ("", "-"):
+        logger.warning("[WG_INJECT] Public key missing for %s", peer.name)
+        return None, "No public key"
+
+    if peer.is_active:
+        cmd = [
+            SUDO, "-n", WG, "set", server.interface,
+            "peer", peer.public_key,
+            "allowed-ips", peer.allowed_ip,
+        ]
+
+        if server.persistent_keepalive:
+            cmd += ["persistent-keepalive", str(server.persistent_keepalive)]
+
+        return cmd, "inject"
+
+    cmd = [
+        SUDO, "-n", WG, "set", server.interface,
+        "peer", peer.public_key,
+        "remove",
+    ]
+    return cmd, "remove"
+
+
+@shared_task(bind=True, max_retries=2, **RETRY_POLICY)
+def inject_peer_live(self, peer_ids):
+    """
+    Apply one peer (an id) or several (a list of ids) to the live
+    interface, over netlink when available. Otherwise several peers are
+    injected concurrently through wg in one event loop.
+    """
+    single = isinstance(peer_ids, int)
+    ids = [peer_ids] if single else list(peer_ids)
+
     try:
-        peer = WireGuardPeer.objects.get(id=peer_id)
-        server = peer.get_server()
-
-        if not server or not server.is_active:
-            return {"status": "skipped", "reason": "No active server"}
-
-        if not peer.public_key or peer.public_key.strip() in ("", "-"):
-            print(f"[WG_INJECT] Public key missing for {peer.name}", file=sys.stderr)
-            return {"status": "skipped", "reason": "No public key"}
-
-        if peer.is_active:
-            cmd = [
-                SUDO, "-n", WG, "set", server.interface,
-                "peer", peer.public_key,
-                "allowed-ips", peer.allowed_ip,
-            ]
-
-            if server.persistent_keepalive:
-                cmd += ["persistent-keepalive", str(server.persistent_keepalive)]
-
-            action = "inject"
-
-        else:
-            cmd = [
-                SUDO, "-n", WG, "set", server.interface,
-                "peer", peer.public_key,
-                "remove",
-            ]
-            action = "remove"
-
-        proc = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
+        peers = list(WireGuardPeer.objects.select_related("server").filter(id__in=ids))
+        if single and not peers:
+            raise WireGuardPeer.DoesNotExist
+
+        results = {}
+        jobs = []
+        for peer in peers:
+            cmd, detail = _peer_command(peer)
+            if cmd is None:
+                results[peer.id] = {"status": "skipped", "reason": detail}
+                continue
+
+            server = peer._effective_server
+            if peer.is_active:
+                spec = WireGuardService.netlink_peer(peer, server.persistent_keepalive)
+            else:
+                spec = {"public_key": peer.public_key, "remove": True}
+            jobs.append((peer, server.interface, spec, cmd, detail))
+
+        live = {}
+
+        def applied(peer, interface, action):
+            logger.info("[WG_INJECT] Peer %s %sed on %s", peer.name, action, interface)
+            results[peer.id] = {"status": "success", "peer": peer.name}
+            live[peer.id] = live_state_digest(
+                peer.public_key, peer.allowed_ip, peer.is_active, peer.server_id
+            )
+
+        # Netlink first (one socket per interface, no sudo); whatever it
+        # couldn't apply goes through wg
+        by_interface = {}
+        for job in jobs:
+            by_interface.setdefault(job[1], []).append(job)
+
+        pending = []
+        for interface, group in by_interface.items():
+            if WireGuardService.set_peers_netlink(interface, [job[2] for job in group]):
+                for peer, _, _, _, action in group:
+                    applied(peer, interface, action)
+            else:
+                pending.extend(group)
+
+        outcomes = WireGuardService.inject_many_sync([job[3] for job in pending])
+
+        errors = []
+        for (peer, interface, _, _, action), outcome in zip(pending, outcomes):
+            if isinstance(outcome, subprocess.CalledProcessError):
+                errors.append(outcome.stderr.strip())
+            elif isinstance(outcome, Exception):
+                raise outcome
+            else:
+                applied(peer, interface, action)
+
+        remember_live_state(live)
+
+        if errors:
+            raise PermissionError("; ".join(errors))
+
+        if single:
+            return results[peers[0].id]
+        return {"status": "success", "results": results}
+
+    except WireGuardPeer.DoesNotExist:
+        return {"status": "error", "message": "Peer not found"}
+
+    except PermissionError as e:
+        logger.error("[WG_INJECT] PERMISSION ERROR: %s", e)
+        raise
+
+    except Exception as e:
+        logger.error("[WG_INJECT] ERROR: %s", e)
+        raise
+
+
+# ============================================================
+# Bulk Peer Sync Task
+# ============================================================
+
+def _peers_conf(server: WireGuardServer, peers: list[dict]) -> str:
+    """
+    wg(8) (not wg-quick) config holding the interface key and every peer.
+    """
+    lines = [
+        "[Interface]",
+        f"PrivateKey = {server.get_private_key()}",
+        f"ListenPort = {server.port}",
+    ]
+    for peer in peers:
+        lines += ["", "[Peer]", f"PublicKey = {peer['public_key']}", f"AllowedIPs = {peer['allowed_ip']}"]
+        if server.persistent_keepalive:
+            lines.append(f"PersistentKeepalive = {server.persistent_keepalive}")
+    return "\n".join(lines) + "\n"
+
+
+@shared_task(bind=True, max_retries=2, **RETRY_POLICY)
+def sync_peers_bulk(self, server_id: int):
+    """
+    Apply the full active peer set of a server with one `wg syncconf`.
+    Peers that are no longer active are removed by the same call.
+    """
+    try:
+        server = get_server_cached(server_id)
+        if not server.is_active:
+            return {"status": "skipped", "reason": "Server inactive"}
+
+        default = WireGuardServer.get_default()
+        is_default = default is not None and default.id == server.id
+        peers = [
+            p for p in get_active_peers()
+            if p["public_key"] and p["public_key"].strip() not in ("", "-")
+            and (p["server_id"] == server.id or (p["server_id"] is None and is_default))
+        ]
+
+        fd, conf_path = tempfile.mkstemp(prefix="wg-sync-", suffix=".conf")
+        try:
+            with os.fdopen(fd, "w") as fh:
+                fh.write(_peers_conf(server, peers))
+
+            proc = subprocess.run(
+                [SUDO, "-n", WG, "syncconf", server.interface, conf_path],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+        finally:
+            os.unlink(conf_path)
 
         if proc.returncode != 0:
             raise PermissionError(proc.stderr.strip())
 
-        print(
-            f"[WG_INJECT] Peer {peer.name} {action}ed on {server.interface}",
-            file=sys.stderr,
-        )
+        remember_live_state({
+            p["id"]: live_state_digest(p["public_key"], p["allowed_ip"], True, p["server_id"])
+            for p in peers
+        })
 
-        return {"status": "success", "peer": peer.name}
+        logger.info("[WG_SYNC] %d peers synced on %s", len(peers), server.interface)
+        return {"status": "success", "server": server.interface, "peers": len(peers)}
 
-    except WireGuardPeer.DoesNotExist:
-        return {"status": "error", "message": "Peer not found"}
+    except WireGuardServer.DoesNotExist:
+        return {"status": "error", "message": "Server not found"}
 
     except PermissionError as e:
-        print(f"[WG_INJECT] PERMISSION ERROR: {e}", file=sys.stderr)
+        logger.error("[WG_SYNC] PERMISSION ERROR: %s", e)
         raise
 
     except Exception as e:
-        print(f"[WG_INJECT] ERROR: {e}", file=sys.stderr)
-        raise self.retry(exc=e, countdown=5)
+        logger.error("[WG_SYNC] ERROR: %s", e)
+        raise